@@ -0,0 +1,165 @@
+"""比較 PostParser 與舊版逐層 deep_get 解析的速度，並確認兩者結果一致
+
+使用方式：
+    python benchmarks/post_parse_bench.py 貼文json檔案或資料夾 [...] [--repeat N]
+
+輸入實際紀錄的貼文，例如 post_output 儲存的 {pid}.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataclasses import asdict
+
+from src.app_types.database import Status
+from src.app_types.post_parse import PostParser, Video, CHANNEL_URL, POST_URL, VIDEO_URL
+from src.utils.tools import deep_get, get_origin_image_url
+
+
+class legacy_parser:
+    def __init__(self, content: dict) -> None:
+        self.content = content
+
+    def get_content_text(self) -> str:
+        """獲取文章內容"""
+        text = ""
+        for item in deep_get(self.content, ['content_text', 'runs'], []):
+            if 'text' in item:
+                if 'urlEndpoint' in item: # 貼文包含連結文字
+                    text += item['urlEndpoint']['url']
+                elif 'browseEndpoint' in item: # 貼文包含YT內部連結
+                    if 'http' not in item['browseEndpoint']['url']:
+                        url = 'https://www.youtube.com/' + item['browseEndpoint']['url']
+                    else:
+                        url = item['browseEndpoint']['url']
+                    text += f"[{item['text']}]({url})"
+                else:
+                    text += item['text']
+            
+        return text
+
+    def get_attachments(self) -> list:
+        """獲取附件圖片連結"""
+        images = []
+        # 附件圖片
+        link = deep_get(self.content, ['backstage_attachment', 'backstageImageRenderer', 'image', 'thumbnails', -1, 'url'], "")
+        images.append(get_origin_image_url(link))
+
+        # 多圖附件
+        links = deep_get(self.content, ['backstage_attachment', 'postMultiImageRenderer', 'images'], [])
+        for image in links:
+            links = deep_get(image, ['backstageImageRenderer', 'image', 'thumbnails'], [])
+            for link in links:
+                if 'url' in link:
+                    images.append(get_origin_image_url(link['url']))
+        return images
+
+
+    def get_video(self) -> Video | None:
+        """獲取影片連結"""
+        video_content = deep_get(self.content, ['backstage_attachment', 'videoRenderer'], {})
+        if video_content:
+            video_id = video_content.get("videoId", '')
+            if video_id:
+                description = ''
+                for item in deep_get(video_content, ['descriptionSnippet', 'runs'], []):
+                    description += item['text']
+                return Video(
+                    url=VIDEO_URL.format(video_id=video_id),
+                    title=deep_get(video_content, ['title', 'runs', 0,'text'], "").replace('\n', ''),
+                    description=description,
+                    thumbnail=get_origin_image_url(deep_get(video_content, ['thumbnail', 'thumbnails', -1, 'url'], '')),
+                    membership=Status.FINISH.value if deep_get(video_content, ['badges', -1, 'metadataBadgeRenderer', 'label'], '') else Status.NOT_PROCESS.value,
+                    length=deep_get(video_content, ['lengthText', 'simpleText'], ''),
+                    uploader_name=deep_get(video_content, ['ownerText', 'runs', 0, 'text'], ''),
+                    uploader_channel=CHANNEL_URL.format(channel_id=deep_get(video_content, ['ownerText', 'runs', 0, 'navigationEndpoint', 'browseEndpoint', 'browseId'], '')),
+                    uploader_thumbnail=get_origin_image_url(deep_get(video_content, ['avatar', 'decoratedAvatarViewModel', 'avatar', 'avatarViewModel', 'image', 'sources', -1, 'url'], '')),
+                )
+        return None
+
+    def get_links(self) -> list:
+        """獲取所有連結"""
+        content_text = deep_get(self.content, ['content_text', 'runs'], [])
+        links = []
+        for item in content_text:
+            if 'urlEndpoint' in item:
+                links.append(item['urlEndpoint']['url'])
+            else:
+                if 'loggingDirectives' in item:
+                    # 處理可能的 loggingDirectives
+                    url = item.get('text', '')
+                    if url and re.match(r'https?://', url):
+                        links.append(url)
+        return links
+
+
+def legacy_parse(content: dict) -> dict:
+    """舊版 PostParser.__post_init__ 的解析流程"""
+    parser = legacy_parser(content)
+    video = parser.get_video()
+    return {
+        'channel_url': CHANNEL_URL.format(channel_id=deep_get(content, ['channel_id'], '')),
+        'post_url': POST_URL.format(post_id=deep_get(content, ['post_id'], '')),
+        'author_name': deep_get(content, ['author', 'authorText', 'runs', 0, 'text'], ''),
+        'author_thumbnail': get_origin_image_url(deep_get(content, ['author', 'authorThumbnail', 'thumbnails', -1, 'url'], '')),
+        'content_text': parser.get_content_text(),
+        'video': asdict(video) if video else None,
+        'attachments': parser.get_attachments(),
+        'content_links': parser.get_links(),
+        'is_membership': True if deep_get(content, ['sponsor_only_badge', 'sponsorsOnlyBadgeRenderer', 'label', 'simpleText'], "") else False,
+    }
+
+def load_posts(paths: list[str]) -> list[dict]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.endswith('.json'))
+        else:
+            files.append(path)
+    posts = []
+    for file in files:
+        with open(file, encoding='utf-8') as f:
+            posts.append(json.load(f))
+    return posts
+
+def measure(name: str, func, repeat: int, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<12} {elapsed:8.3f} 秒  {count * repeat / elapsed:12.0f} 則/秒")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="PostParser 解析速度比較")
+    parser.add_argument('paths', nargs='+', help="貼文json檔案或資料夾(post_output 儲存的貼文)")
+    parser.add_argument('--repeat', type=int, default=200, help="重複解析次數")
+    args = parser.parse_args()
+
+    posts = load_posts(args.paths)
+    if not posts:
+        parser.error("找不到貼文json")
+    print(f"貼文數量：{len(posts)}，重複次數：{args.repeat}")
+
+    mismatches = 0
+    for post in posts:
+        record = PostParser(post).to_record()
+        record.pop('version')
+        if record != legacy_parse(post):
+            mismatches += 1
+            print(f"解析結果不一致：{post.get('post_id', '')}")
+    print(f"結果不一致數量：{mismatches}")
+
+    legacy = measure("legacy", lambda: [legacy_parse(post) for post in posts], args.repeat, len(posts))
+    schema = measure("schema", lambda: [PostParser(post) for post in posts], args.repeat, len(posts))
+    print(f"加速倍數：{legacy / schema:.2f}x")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
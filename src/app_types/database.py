@@ -11,6 +11,7 @@ class Data_PostEnum(str, Enum):
     PID = 'pid'
     TIME = 'time'
     CONTENT = 'content'
+    PARSED = 'parsed'
     LINKS = 'links'
     MEMBERSHIP = 'membership'
     ORIGIN_NOTIFY = 'origin_notify'
@@ -25,12 +26,175 @@ class Data_Post:
         metadata={
             "sql": "PRIMARY KEY AUTOINCREMENT",
         }) # 紀錄貼文儲存ID順序
-    pid: str = '' # 紀錄貼文ID
+    pid: str = field(
+        default='',
+        metadata={
+            "index": "UNIQUE",
+        }) # 紀錄貼文ID
     time: str = '' # 紀錄下載時間(YT沒有貼文發布時間)
-    content: dict = field(default_factory=dict) # 紀錄貼文Json完整內容
+    content: dict = field(
+        default_factory=dict,
+        metadata={
+            "compress": True,
+        }) # 紀錄貼文Json完整內容
+    parsed: dict = field(default_factory=dict) # 紀錄解析後的貼文資訊(PostParser.to_record)
     links: List[str] = field(default_factory=list) # 紀錄所有連結
     membership: int = Status.NOT_PROCESS # 紀錄是否為會員貼文
-    origin_notify: int = Status.NOT_PROCESS # 紀錄上傳貼文狀態
-    translate_notify: int = Status.NOT_PROCESS # 紀錄翻譯貼文狀態
+    origin_notify: int = field(
+        default=Status.NOT_PROCESS,
+        metadata={
+            "pending_index": Status.NOT_PROCESS,
+        }) # 紀錄上傳貼文狀態
+    translate_notify: int = field(
+        default=Status.NOT_PROCESS,
+        metadata={
+            "pending_index": Status.NOT_PROCESS,
+        }) # 紀錄翻譯貼文狀態
     media_notify: int = Status.NOT_PROCESS # 紀錄下載媒體檔案狀態
-    downloaded: int = Status.NOT_PROCESS # 紀錄下載媒體檔案狀態
+    downloaded: int = field(
+        default=Status.NOT_PROCESS,
+        metadata={
+            "pending_index": Status.NOT_PROCESS,
+        }) # 紀錄下載媒體檔案狀態
+
+class LinkKind(str, Enum):
+    MEDIAFIRE = 'mediafire'
+    YOUTUBE_VIDEO = 'youtube_video'
+    IMAGE = 'image'
+    OTHER = 'other'
+
+# 媒體下載階段會處理的連結種類
+DOWNLOADABLE_KINDS = (LinkKind.MEDIAFIRE,)
+
+class Data_LinkEnum(str, Enum):
+    ID = 'id'
+    PID = 'pid'
+    URL = 'url'
+    KIND = 'kind'
+
+@dataclass
+class Data_Link:
+    id: int = field(
+        default=0,
+        metadata={
+            "sql": "PRIMARY KEY AUTOINCREMENT",
+        })
+    pid: str = field(
+        default='',
+        metadata={
+            "index": "INDEX",
+        }) # 紀錄所屬貼文ID
+    url: str = '' # 紀錄連結
+    kind: str = field(
+        default=LinkKind.OTHER.value,
+        metadata={
+            "index": "INDEX",
+        }) # 紀錄連結種類
+
+class Data_JobEnum(str, Enum):
+    ID = 'id'
+    PID = 'pid'
+    STAGE = 'stage'
+    ATTEMPTS = 'attempts'
+    NEXT_ATTEMPT_AT = 'next_attempt_at'
+    LEASE_OWNER = 'lease_owner'
+    LEASE_EXPIRY = 'lease_expiry'
+    LAST_ERROR = 'last_error'
+
+@dataclass
+class Data_Job:
+    id: int = field(
+        default=0,
+        metadata={
+            "sql": "PRIMARY KEY AUTOINCREMENT",
+        })
+    pid: str = '' # 紀錄貼文ID
+    stage: str = '' # 紀錄階段名稱(對應 Data_Post 的狀態欄位)
+    attempts: int = 0 # 紀錄失敗次數
+    next_attempt_at: float = 0 # 紀錄下次可執行時間(timestamp)
+    lease_owner: str = '' # 紀錄目前處理中的程序
+    lease_expiry: float = 0 # 紀錄處理權到期時間(timestamp)，到期後其他程序可接手
+    last_error: str = '' # 紀錄最後一次失敗原因
+
+@dataclass
+class Data_Lease:
+    id: int = field(
+        default=0,
+        metadata={
+            "sql": "PRIMARY KEY AUTOINCREMENT",
+        })
+    name: str = field(
+        default='',
+        metadata={
+            "sql": "UNIQUE",
+        }) # 紀錄租約名稱(工作程序或設定檔)
+    owner: str = '' # 紀錄持有租約的程序
+    expiry: float = 0 # 紀錄租約到期時間(timestamp)
+
+@dataclass
+class Data_Download:
+    id: int = field(
+        default=0,
+        metadata={
+            "sql": "PRIMARY KEY AUTOINCREMENT",
+        })
+    url: str = field(
+        default='',
+        metadata={
+            "sql": "UNIQUE",
+        }) # 紀錄統一格式後的下載網址
+    path: str = '' # 紀錄下載完成的檔案路徑
+    size: int = 0 # 紀錄檔案大小
+    etag: str = '' # 紀錄伺服器回傳的 ETag
+    last_modified: str = '' # 紀錄伺服器回傳的 Last-Modified
+    sha256: str = '' # 紀錄檔案內容雜湊
+    updated: float = 0 # 紀錄下載時間(timestamp)
+
+@dataclass
+class Data_Blob:
+    id: int = field(
+        default=0,
+        metadata={
+            "sql": "PRIMARY KEY AUTOINCREMENT",
+        })
+    sha256: str = field(
+        default='',
+        metadata={
+            "sql": "UNIQUE",
+        }) # 紀錄檔案內容雜湊，同時為內容庫中的檔名
+    size: int = 0 # 紀錄檔案大小
+    extracted: str = '' # 紀錄解壓縮輸出目錄，空白表示未解壓縮
+    uploaded: str = '' # 紀錄已上傳的通知頻道(webhook 雜湊)，空白表示未上傳
+    created: float = 0 # 紀錄存入時間(timestamp)
+
+@dataclass
+class Data_Crawl:
+    id: int = field(
+        default=0,
+        metadata={
+            "sql": "PRIMARY KEY AUTOINCREMENT",
+        })
+    config_name: str = field(
+        default='',
+        metadata={
+            "sql": "UNIQUE",
+        }) # 紀錄設定檔對應的儲存表名稱
+    continuation_token: str = '' # 紀錄下一頁的翻頁憑證，空值代表已讀取完畢
+    click_tracking_params: str = '' # 紀錄翻頁請求所需參數
+    visitor_data: str = '' # 紀錄翻頁請求所需參數
+    page_count: int = 0 # 紀錄已讀取頁數
+
+@dataclass
+class Data_Handle:
+    id: int = field(
+        default=0,
+        metadata={
+            "sql": "PRIMARY KEY AUTOINCREMENT",
+        })
+    handle: str = field(
+        default='',
+        metadata={
+            "sql": "UNIQUE",
+        }) # 紀錄頻道標籤(@handle)
+    channel_id: str = '' # 紀錄對應的頻道ID
+    updated: float = 0 # 紀錄轉換時間(timestamp)
@@ -61,6 +61,30 @@ class SaveParams:
             "help": "下載檔案輸出路徑",
             }
         )
+    download_segments: int = field(
+        default= 1,
+        metadata={
+            "help": "MediaFire 單一檔案以直接下載網址分段下載的連線數，大於1時啟用，大型檔案同時下載多個範圍\n無法取得直接網址時改用 mdrs 下載",
+            }
+        )
+    attachment_concurrency: int = field(
+        default= 8,
+        metadata={
+            "help": "所有貼文合計同時下載附件的數量",
+            }
+        )
+    compress_content: bool = field(
+        default= False,
+        metadata={
+            "help": "是否以壓縮格式紀錄貼文內容",
+            }
+    )
+    media_store: str = field(
+        default= '',
+        metadata={
+            "help": "內容庫目錄，相同內容的檔案只儲存一份並以硬連結放入各貼文目錄，需與下載目錄位於同一磁碟，空白時不使用",
+            }
+        )
 
 @dataclass
 class TranslateParams:
@@ -111,6 +135,150 @@ class DiscordParams:
         }
         )
 
+@dataclass
+class CrawlParams:
+    incremental: bool = field(
+        default= False,
+        metadata={
+            "help": "是否啟用增量爬取\n遇到已紀錄的貼文頁面即停止翻頁",
+            }
+    )
+    incremental_overlap: int = field(
+        default= 1,
+        metadata={
+            "help": "增量爬取時，連續多少頁皆為已紀錄貼文才停止翻頁",
+            }
+        )
+    backfill: bool = field(
+        default= False,
+        metadata={
+            "help": "是否啟用可續傳爬取\n每頁讀取後將翻頁進度紀錄至資料庫，中斷後從該頁繼續",
+            }
+    )
+    handle_cache_days: int = field(
+        default= 30,
+        metadata={
+            "help": "頻道標籤轉換頻道ID的快取天數",
+            }
+        )
+    bulk: str = field(
+        default= '',
+        metadata={
+            "help": "批次下載的貼文清單檔案路徑\n每行一則貼文網址或ID",
+            }
+        )
+    bulk_workers: int = field(
+        default= 8,
+        metadata={
+            "help": "批次下載時同時讀取的貼文數量",
+            }
+        )
+
+@dataclass
+class RunParams:
+    workers: int = field(
+        default= 1,
+        metadata={
+            "help": "同時執行的設定檔數量",
+            }
+        )
+    pipeline: bool = field(
+        default= False,
+        metadata={
+            "help": "是否以串流管線執行\n每則貼文完成前一階段即進入下一階段，各階段同時運作",
+            }
+    )
+    pipeline_queue_size: int = field(
+        default= 8,
+        metadata={
+            "help": "管線各階段之間的佇列長度",
+            }
+        )
+    stage_workers: int = field(
+        default= 2,
+        metadata={
+            "help": "管線中下載階段同時處理的貼文數量\n通知與翻譯階段依序發送，固定使用單一執行緒",
+            }
+        )
+    migrate_compress: bool = field(
+        default= False,
+        metadata={
+            "help": "將資料庫中既有的貼文內容轉換為壓縮格式後結束",
+            }
+    )
+    job_max_attempts: int = field(
+        default= 8,
+        metadata={
+            "help": "各階段處理貼文失敗的最大次數，超過後不再重試",
+            }
+        )
+    job_retry_delay: int = field(
+        default= 60,
+        metadata={
+            "help": "處理貼文失敗後的重試等待時間(秒)，每次失敗加倍",
+            }
+        )
+    job_lease_seconds: int = field(
+        default= 3600,
+        metadata={
+            "help": "處理貼文時保留處理權的時間(秒)，逾時後其他程序可接手",
+            }
+        )
+    supervisor_workers: int = field(
+        default= 0,
+        metadata={
+            "help": "大於0時以監督模式啟動指定數量的工作程序常駐執行\n設定檔依一致性雜湊分配，工作程序停止時由其他程序接手",
+            }
+        )
+    lease_seconds: int = field(
+        default= 120,
+        metadata={
+            "help": "監督模式下工作程序與設定檔租約的有效時間(秒)",
+            }
+        )
+    daemon: bool = field(
+        default= False,
+        metadata={
+            "help": "是否常駐執行\n依各頻道的發文頻率自動調整檢查間隔",
+            }
+    )
+    poll_interval: int = field(
+        default= 600,
+        metadata={
+            "help": "常駐執行時的初始檢查間隔(秒)",
+            }
+        )
+    poll_min_interval: int = field(
+        default= 60,
+        metadata={
+            "help": "常駐執行時的最短檢查間隔(秒)",
+            }
+        )
+    poll_max_interval: int = field(
+        default= 3600,
+        metadata={
+            "help": "常駐執行時的最長檢查間隔(秒)",
+            }
+        )
+    youtube_interval: float = field(
+        default= 1.0,
+        metadata={
+            "help": "同一程序對 YouTube 的最小請求間隔(秒)，所有設定檔與執行緒共用，0 為不限制",
+            }
+        )
+    discord_interval: float = field(
+        default= 0.5,
+        metadata={
+            "help": "同一程序對 Discord 的最小請求間隔(秒)，0 為不限制",
+            }
+        )
+    mediafire_interval: float = field(
+        default= 1.0,
+        metadata={
+            "help": "同一程序對 MediaFire 的最小請求間隔(秒)，0 為不限制",
+            }
+        )
+
 @dataclass
 class AdditionalParams:
     config_name: str = field(
@@ -121,7 +289,7 @@ class AdditionalParams:
     )
 
 @dataclass
-class AllParams(DiscordParams, TranslateParams, SaveParams, DefaultParams):
+class AllParams(RunParams, DiscordParams, TranslateParams, CrawlParams, SaveParams, DefaultParams):
     pass
 
 @dataclass
@@ -2,15 +2,18 @@ import os
 import re
 
 from datetime import datetime, timezone
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, asdict
 from typing import List
 
-from src.utils.tools import deep_get, get_origin_image_url, get_size
+from src.utils.tools import get_origin_image_url, get_size
+from src.utils.extract import Field, Schema
 from src.app_types.database import Status
 
 CHANNEL_URL = "https://www.youtube.com/channel/{channel_id}"
 POST_URL = "https://www.youtube.com/post/{post_id}"
 VIDEO_URL = "https://www.youtube.com/watch?v={video_id}"
+# 解析結果紀錄格式版本，解析內容變更時需更新版本，舊版紀錄改為重新解析
+RECORD_VERSION = 1
 
 class today(object):
     utc_now = datetime.now(timezone.utc)
@@ -27,6 +30,7 @@ class FileInfo:
     url: str
     name: str = ''
     size: int = 0
+    sha256: str = '' # 內容雜湊，啟用內容庫時用於略過重複上傳
 
     def __post_init__(self):
         if os.path.exists(self.path) and self.name:
@@ -61,91 +65,143 @@ class PostParser:
     is_membership: bool = False
 
     def __post_init__(self):
-        parser = _parser(self.content)
-        self.today = today.year + today.month + today.day
-        self.channel_url = CHANNEL_URL.format(channel_id=deep_get(self.content, ['channel_id'], ''))
-        self.post_url = POST_URL.format(post_id=deep_get(self.content, ['post_id'], ''))
-        self.author_name = deep_get(self.content, ['author', 'authorText', 'runs', 0, 'text'], '')
-        self.author_thumbnail = get_origin_image_url(deep_get(self.content, ['author', 'authorThumbnail', 'thumbnails', -1, 'url'], ''))
-        self.content_text = parser.get_content_text()
-        self.video = parser.get_video()
-        self.attachments = parser.get_attachments()
-        self.content_links = parser.get_links()
-        self.is_membership = True if deep_get(self.content, ['sponsor_only_badge', 'sponsorsOnlyBadgeRenderer', 'label', 'simpleText'], "") else False
-
-
-class _parser:
-    def __init__(self, content: dict) -> None:
-        self.content = content
-
-    def get_content_text(self) -> str:
-        """獲取文章內容"""
-        text = ""
-        for item in deep_get(self.content, ['content_text', 'runs'], []):
-            if 'text' in item:
-                if 'urlEndpoint' in item: # 貼文包含連結文字
-                    text += item['urlEndpoint']['url']
-                elif 'browseEndpoint' in item: # 貼文包含YT內部連結
-                    if 'http' not in item['browseEndpoint']['url']:
-                        url = 'https://www.youtube.com/' + item['browseEndpoint']['url']
-                    else:
-                        url = item['browseEndpoint']['url']
-                    text += f"[{item['text']}]({url})"
-                else:
-                    text += item['text']
-            
-        return text
-
-    def get_attachments(self) -> list:
-        """獲取附件圖片連結"""
-        images = []
-        # 附件圖片
-        link = deep_get(self.content, ['backstage_attachment', 'backstageImageRenderer', 'image', 'thumbnails', -1, 'url'], "")
-        images.append(get_origin_image_url(link))
-
-        # 多圖附件
-        links = deep_get(self.content, ['backstage_attachment', 'postMultiImageRenderer', 'images'], [])
-        for image in links:
-            links = deep_get(image, ['backstageImageRenderer', 'image', 'thumbnails'], [])
-            for link in links:
-                if 'url' in link:
-                    images.append(get_origin_image_url(link['url']))
-        return images
-
-
-    def get_video(self) -> Video | None:
-        """獲取影片連結"""
-        video_content = deep_get(self.content, ['backstage_attachment', 'videoRenderer'], {})
-        if video_content:
-            video_id = video_content.get("videoId", '')
-            if video_id:
-                description = ''
-                for item in deep_get(video_content, ['descriptionSnippet', 'runs'], []):
-                    description += item['text']
-                return Video(
-                    url=VIDEO_URL.format(video_id=video_id),
-                    title=deep_get(video_content, ['title', 'runs', 0,'text'], "").replace('\n', ''),
-                    description=description,
-                    thumbnail=get_origin_image_url(deep_get(video_content, ['thumbnail', 'thumbnails', -1, 'url'], '')),
-                    membership=Status.FINISH.value if deep_get(video_content, ['badges', -1, 'metadataBadgeRenderer', 'label'], '') else Status.NOT_PROCESS.value,
-                    length=deep_get(video_content, ['lengthText', 'simpleText'], ''),
-                    uploader_name=deep_get(video_content, ['ownerText', 'runs', 0, 'text'], ''),
-                    uploader_channel=CHANNEL_URL.format(channel_id=deep_get(video_content, ['ownerText', 'runs', 0, 'navigationEndpoint', 'browseEndpoint', 'browseId'], '')),
-                    uploader_thumbnail=get_origin_image_url(deep_get(video_content, ['avatar', 'decoratedAvatarViewModel', 'avatar', 'avatarViewModel', 'image', 'sources', -1, 'url'], '')),
-                )
-        return None
+        self.apply_fields(POST_SCHEMA.extract(self.content))
 
-    def get_links(self) -> list:
-        """獲取所有連結"""
-        content_text = deep_get(self.content, ['content_text', 'runs'], [])
-        links = []
-        for item in content_text:
-            if 'urlEndpoint' in item:
-                links.append(item['urlEndpoint']['url'])
+    def apply_fields(self, fields: dict):
+        self.today = today.year + today.month + today.day
+        self.channel_url = CHANNEL_URL.format(channel_id=fields['channel_id'])
+        self.post_url = POST_URL.format(post_id=fields['post_id'])
+        self.author_name = fields['author_name']
+        self.author_thumbnail = fields['author_thumbnail']
+        self.content_text = get_content_text(fields['content_runs'])
+        self.video = fields['video']
+        self.attachments = get_attachments(fields['image'], fields['multi_images'])
+        self.content_links = get_links(fields['content_runs'])
+        self.is_membership = fields['is_membership']
+
+    def to_record(self) -> dict:
+        """輸出解析結果，供資料庫保存後以 from_record 還原"""
+        return {
+            'version': RECORD_VERSION,
+            'channel_url': self.channel_url,
+            'post_url': self.post_url,
+            'author_name': self.author_name,
+            'author_thumbnail': self.author_thumbnail,
+            'content_text': self.content_text,
+            'video': asdict(self.video) if self.video else None,
+            'attachments': self.attachments,
+            'content_links': self.content_links,
+            'is_membership': self.is_membership,
+        }
+
+    @classmethod
+    def from_record(cls, record: dict, content: dict | None = None) -> "PostParser":
+        """以解析結果建立，不重新解析貼文json"""
+        parser = cls.__new__(cls)
+        parser.content = content or {}
+        parser.today = today.year + today.month + today.day
+        parser.channel_url = record['channel_url']
+        parser.post_url = record['post_url']
+        parser.author_name = record['author_name']
+        parser.author_thumbnail = record['author_thumbnail']
+        parser.content_text = record['content_text']
+        parser.video = Video(**record['video']) if record['video'] else None
+        parser.attachments = list(record['attachments'])
+        parser.content_links = list(record['content_links'])
+        parser.is_membership = record['is_membership']
+        return parser
+
+    @staticmethod
+    def is_valid_record(record: dict | None) -> bool:
+        return bool(record) and record.get('version') == RECORD_VERSION
+
+
+def get_content_text(runs: list) -> str:
+    """獲取文章內容"""
+    texts = []
+    for item in runs:
+        if 'text' in item:
+            if 'urlEndpoint' in item: # 貼文包含連結文字
+                texts.append(item['urlEndpoint']['url'])
+            elif 'browseEndpoint' in item: # 貼文包含YT內部連結
+                url = item['browseEndpoint']['url']
+                if 'http' not in url:
+                    url = 'https://www.youtube.com/' + url
+                texts.append(f"[{item['text']}]({url})")
             else:
-                if 'loggingDirectives' in item:
-                    # 處理可能的 loggingDirectives
-                    url = item.get('text', '')
-                    if url and re.match(r'https?://', url):
-                        links.append(url)
-        return links
+                texts.append(item['text'])
+    return ''.join(texts)
+
+def get_attachments(image: str, multi_images: list) -> list:
+    """獲取附件圖片連結"""
+    # 附件圖片
+    images = [image]
+    # 多圖附件
+    for item in multi_images:
+        for link in IMAGE_SCHEMA.extract(item)['thumbnails']:
+            if 'url' in link:
+                images.append(get_origin_image_url(link['url']))
+    return images
+
+def get_links(runs: list) -> list:
+    """獲取所有連結"""
+    links = []
+    for item in runs:
+        if 'urlEndpoint' in item:
+            links.append(item['urlEndpoint']['url'])
+        elif 'loggingDirectives' in item:
+            # 處理可能的 loggingDirectives
+            url = item.get('text', '')
+            if url and URL_PATTERN.match(url):
+                links.append(url)
+    return links
+
+def get_video(video_content: dict | None) -> Video | None:
+    """獲取影片連結"""
+    if not video_content:
+        return None
+    fields = VIDEO_SCHEMA.extract(video_content)
+    if not fields['video_id']:
+        return None
+    return Video(
+        url=VIDEO_URL.format(video_id=fields['video_id']),
+        title=fields['title'],
+        description=''.join(item['text'] for item in fields['description_runs']),
+        thumbnail=fields['thumbnail'],
+        membership=fields['membership'],
+        length=fields['length'],
+        uploader_name=fields['uploader_name'],
+        uploader_channel=CHANNEL_URL.format(channel_id=fields['uploader_channel_id']),
+        uploader_thumbnail=fields['uploader_thumbnail'],
+    )
+
+URL_PATTERN = re.compile(r'https?://')
+
+# 貼文json的欄位位置，YouTube 格式變更時只需修改以下設定
+POST_SCHEMA = Schema({
+    'channel_id': Field(['channel_id'], ''),
+    'post_id': Field(['post_id'], ''),
+    'author_name': Field(['author', 'authorText', 'runs', 0, 'text'], ''),
+    'author_thumbnail': Field(['author', 'authorThumbnail', 'thumbnails', -1, 'url'], '', get_origin_image_url),
+    'content_runs': Field(['content_text', 'runs'], ()),
+    'image': Field(['backstage_attachment', 'backstageImageRenderer', 'image', 'thumbnails', -1, 'url'], '', get_origin_image_url),
+    'multi_images': Field(['backstage_attachment', 'postMultiImageRenderer', 'images'], ()),
+    'video': Field(['backstage_attachment', 'videoRenderer'], None, get_video),
+    'is_membership': Field(['sponsor_only_badge', 'sponsorsOnlyBadgeRenderer', 'label', 'simpleText'], '', bool),
+})
+
+IMAGE_SCHEMA = Schema({
+    'thumbnails': Field(['backstageImageRenderer', 'image', 'thumbnails'], ()),
+})
+
+VIDEO_SCHEMA = Schema({
+    'video_id': Field(['videoId'], ''),
+    'title': Field(['title', 'runs', 0, 'text'], '', lambda title: title.replace('\n', '')),
+    'description_runs': Field(['descriptionSnippet', 'runs'], ()),
+    'thumbnail': Field(['thumbnail', 'thumbnails', -1, 'url'], '', get_origin_image_url),
+    'membership': Field(['badges', -1, 'metadataBadgeRenderer', 'label'], '', lambda label: Status.FINISH.value if label else Status.NOT_PROCESS.value),
+    'length': Field(['lengthText', 'simpleText'], ''),
+    'uploader_name': Field(['ownerText', 'runs', 0, 'text'], ''),
+    'uploader_channel_id': Field(['ownerText', 'runs', 0, 'navigationEndpoint', 'browseEndpoint', 'browseId'], ''),
+    'uploader_thumbnail': Field(['avatar', 'decoratedAvatarViewModel', 'avatar', 'avatarViewModel', 'image', 'sources', -1, 'url'], '', get_origin_image_url),
+})
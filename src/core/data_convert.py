@@ -1,4 +1,5 @@
 from src.app_types import database, post_parse
+from src.app_types.database import LinkKind, DOWNLOADABLE_KINDS, Status
 
 
 def remove_same_videos(links: set[str]):
@@ -24,14 +25,40 @@ def get_all_post_links(parser: post_parse.PostParser) -> list[str]:
     remove_same_videos(links)
     return list(links)
 
+def classify_link(link: str) -> LinkKind:
+    """依網址判斷連結種類"""
+    if 'mediafire' in link:
+        return LinkKind.MEDIAFIRE
+    if 'youtu.be/' in link or 'youtube.com/watch' in link:
+        return LinkKind.YOUTUBE_VIDEO
+    if 'ggpht.com' in link or 'googleusercontent.com' in link:
+        return LinkKind.IMAGE
+    return LinkKind.OTHER
+
+def has_downloadable_links(links: list[str]) -> bool:
+    return any(classify_link(link) in DOWNLOADABLE_KINDS for link in links)
+
+def convert_links_to_type(pid: str, links: list[str]) -> list[database.Data_Link]:
+    return [database.Data_Link(pid=pid, url=link, kind=classify_link(link).value) for link in links]
+
+def get_post_parser(post: database.Data_Post) -> post_parse.PostParser:
+    """優先使用紀錄的解析結果，沒有紀錄或紀錄版本不符時重新解析貼文json"""
+    if post_parse.PostParser.is_valid_record(post.parsed):
+        return post_parse.PostParser.from_record(post.parsed)
+    return post_parse.PostParser(post.content)
+
 def convert_post_to_type(post_data: dict) -> database.Data_Post:
     parser = post_parse.PostParser(post_data)
+    links = get_all_post_links(parser)
     
     post = database.Data_Post(
         pid=post_data.get('post_id', ''),
         time=post_parse.today.year + post_parse.today.month + post_parse.today.day,
         content=post_data,
-        links=get_all_post_links(parser),
-        membership=parser.is_membership
+        parsed=parser.to_record(),
+        links=links,
+        membership=parser.is_membership,
+        # 沒有可下載連結的貼文不進入媒體下載階段
+        downloaded=Status.NOT_PROCESS if has_downloadable_links(links) else Status.FINISH
     )
     return post
\ No newline at end of file
@@ -0,0 +1,68 @@
+import queue
+import logging
+import threading
+
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+@dataclass
+class Stage:
+    """管線中的單一階段，handler 處理每則資料，workers 為同時處理的執行緒數量
+    handler 回傳False時該則資料不送往下一階段
+    """
+    name: str
+    handler: Callable[[Any], Any]
+    workers: int = 1
+
+def _stage_worker(stage: Stage, inbox: queue.Queue, outbox: queue.Queue | None):
+    while True:
+        item = inbox.get()
+        if item is _STOP:
+            return
+        keep = True
+        try:
+            keep = stage.handler(item) is not False
+        except Exception as e:
+            log.error(f"階段 {stage.name} 處理失敗：{e}")
+        if keep and outbox is not None:
+            outbox.put(item)
+
+def run_pipeline(source: Iterable, stages: list[Stage], queue_size: int = 8) -> int:
+    """將source中的每則資料依序送入各階段
+    階段之間以有界佇列連接，前一階段處理完一則即交給下一階段，各階段同時運作
+    回傳處理的資料數量
+    """
+    queues = [queue.Queue(maxsize=max(queue_size, 1)) for _ in stages]
+    threads: list[list[threading.Thread]] = []
+    for index, stage in enumerate(stages):
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+        stage_threads = [
+            threading.Thread(
+                target=_stage_worker,
+                args=(stage, queues[index], outbox),
+                name=f"{threading.current_thread().name}-{stage.name}-{n}",
+                daemon=True,
+            )
+            for n in range(max(stage.workers, 1))
+        ]
+        for thread in stage_threads:
+            thread.start()
+        threads.append(stage_threads)
+
+    count = 0
+    try:
+        for item in source:
+            queues[0].put(item)
+            count += 1
+    finally:
+        # 依序關閉各階段，確保前一階段的資料全部送出後才關閉下一階段
+        for index, stage_threads in enumerate(threads):
+            for _ in stage_threads:
+                queues[index].put(_STOP)
+            for thread in stage_threads:
+                thread.join()
+    return count
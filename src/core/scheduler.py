@@ -0,0 +1,60 @@
+import time
+import logging
+
+from dataclasses import dataclass, field
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+
+log = logging.getLogger(__name__)
+
+@dataclass
+class PollJob:
+    """常駐排程中的單一頻道，run 回傳本次新增的貼文數量
+    run 回傳None表示本次未執行(例如由其他程序負責)，不調整輪詢間隔，改在 skip_interval 秒後再次檢查
+    """
+    name: str
+    run: Callable[[], int | None]
+    interval: float
+    skip_interval: float = 0
+    next_run: float = 0
+    running: bool = field(default=False, repr=False)
+
+def adapt_interval(interval: float, new_posts: int, min_interval: float, max_interval: float) -> float:
+    """依本次新增貼文數調整輪詢間隔：有新貼文時縮短一半，無新貼文時放寬1.5倍"""
+    if new_posts:
+        interval = interval / 2
+    else:
+        interval = interval * 1.5
+    return min(max(interval, min_interval), max_interval)
+
+def run_forever(jobs: list[PollJob], min_interval: float, max_interval: float, workers: int = 1):
+    """常駐執行各頻道，每個頻道依自身的輪詢間隔排程"""
+    futures: dict[Future, PollJob] = {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="station") as executor:
+        while True:
+            now = time.monotonic()
+            for job in jobs:
+                if not job.running and job.next_run <= now:
+                    job.running = True
+                    futures[executor.submit(job.run)] = job
+
+            idle_jobs = [job.next_run for job in jobs if not job.running]
+            timeout = max(min(idle_jobs) - time.monotonic(), 0) if idle_jobs else None
+            if not futures:
+                time.sleep(timeout or 0)
+                continue
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = futures.pop(future)
+                job.running = False
+                try:
+                    new_posts = future.result()
+                except Exception as e:
+                    log.error(f"設定檔：{job.name} 執行失敗：{e}")
+                    new_posts = 0
+                if new_posts is None:
+                    job.next_run = time.monotonic() + (job.skip_interval or job.interval)
+                    continue
+                job.interval = adapt_interval(job.interval, new_posts, min_interval, max_interval)
+                job.next_run = time.monotonic() + job.interval
+                log.info(f"設定檔：{job.name} 新增貼文 {new_posts} 則，{job.interval:.0f} 秒後再次檢查")
@@ -0,0 +1,57 @@
+import time
+import bisect
+import hashlib
+import logging
+import multiprocessing
+
+from typing import Callable, Hashable, Iterable
+
+log = logging.getLogger(__name__)
+
+class HashRing:
+    """一致性雜湊，工作程序數量變動時只有少部分設定檔需要更換負責的程序"""
+    def __init__(self, nodes: Iterable[Hashable], replicas: int = 64) -> None:
+        self.ring: list[tuple[int, Hashable]] = []
+        for node in nodes:
+            for replica in range(replicas):
+                self.ring.append((self.hash(f"{node}#{replica}"), node))
+        self.ring.sort()
+        self.keys = [key for key, _ in self.ring]
+
+    @staticmethod
+    def hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    def get(self, key: str) -> Hashable:
+        index = bisect.bisect(self.keys, self.hash(key)) % len(self.ring)
+        return self.ring[index][1]
+
+def supervise(count: int, target: Callable, args: tuple = (), check_interval: float = 5):
+    """啟動指定數量的工作程序，target 以 (程序編號, 程序數量, *args) 呼叫
+    工作程序結束時重新啟動，期間由其他程序依租約接手
+    """
+    processes: dict[int, multiprocessing.Process] = {}
+
+    def start(index: int):
+        process = multiprocessing.Process(target=target, args=(index, count, *args), name=f"worker-{index}")
+        process.start()
+        processes[index] = process
+        log.info(f"啟動工作程序 {index}，PID：{process.pid}")
+
+    for index in range(count):
+        start(index)
+    try:
+        while True:
+            time.sleep(check_interval)
+            for index, process in list(processes.items()):
+                if not process.is_alive():
+                    log.warning(f"工作程序 {index} 已結束(代碼：{process.exitcode})，重新啟動")
+                    start(index)
+    except KeyboardInterrupt:
+        log.info(f"停止所有工作程序")
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            process.join()
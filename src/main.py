@@ -1,162 +1,629 @@
 import os
-import asyncio
-
-from youtube_community_tab.post import Post as YT_Post
+import time
+import shutil
+import socket
+import itertools
+import threading
+import multiprocessing
+from dataclasses import asdict
+from typing import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait
 
 from src import BASE_DIR, __description__
 from src.app_types import discord
-from src.app_types.post_parse import PostParser
-from src.app_types.database import Data_PostEnum, Data_Post, Status
-from src.core import data_convert
-from src.config import logger
+from src.app_types.database import Data_PostEnum, Data_Post, Data_LinkEnum, Data_Link, Data_Job, Data_Crawl, Data_Handle, Status, DOWNLOADABLE_KINDS
+from src.core import data_convert, pipeline, scheduler, supervisor
+from src.utils.tools import chunked
+from src.utils.rate_limit import limiter
+from src.config import logger, setting
 from src.service import load_channels, graber, archive, downloader, notify, translate
 
 log = logger.setup_logging()
 
+RECORD_BATCH_SIZE = 100 # 批次紀錄貼文時每個交易的貼文數量
+# 各階段從資料庫讀取的欄位，有解析結果時不會解碼 content
+NOTIFY_COLUMNS = [Data_PostEnum.PID.value, Data_PostEnum.CONTENT.value, Data_PostEnum.PARSED.value, Data_PostEnum.ORIGIN_NOTIFY.value]
+TRANSLATE_COLUMNS = [Data_PostEnum.PID.value, Data_PostEnum.CONTENT.value, Data_PostEnum.PARSED.value, Data_PostEnum.TRANSLATE_NOTIFY.value]
+DOWNLOAD_COLUMNS = [Data_PostEnum.PID.value, Data_PostEnum.CONTENT.value, Data_PostEnum.PARSED.value, Data_PostEnum.LINKS.value, Data_PostEnum.DOWNLOADED.value]
+PIPELINE_COLUMNS = [
+    Data_PostEnum.PID.value,
+    Data_PostEnum.CONTENT.value,
+    Data_PostEnum.PARSED.value,
+    Data_PostEnum.LINKS.value,
+    Data_PostEnum.ORIGIN_NOTIFY.value,
+    Data_PostEnum.TRANSLATE_NOTIFY.value,
+    Data_PostEnum.DOWNLOADED.value,
+]
+
 class work_station:
     def __init__(self, config: load_channels.params.FileParams) -> None:
         self.config = config
         self.db = None
+        self.link_db = None
+        self.jobs = None
+        self.manifest = None
+        self.crawl_db = None
+        self.handle_db = None
         self.init_database()
 
         self.data_posts = []
+        self.new_post_count = 0
+        self.pid_cache: set[str] | None = None
+        self.attachment_futures: list[Future] = []
+        # 工作表中的處理權擁有者，以主機名稱與程序ID區分不同程序
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
 
     def init_database(self):
         if self.config.enable_archive:
-            self.db = archive.database(self.config.archive_output, os.path.splitext(os.path.basename(self.config.config_name))[0], Data_Post)
+            self.db = archive.database(self.config.archive_output, os.path.splitext(os.path.basename(self.config.config_name))[0], Data_Post, self.config.compress_content)
+            self.link_db = archive.database(self.config.archive_output, f'{self.db.table_name}_links', Data_Link)
+            self.backfill_links()
+            self.jobs = archive.job_queue(
+                self.config.archive_output, f'{self.db.table_name}_jobs',
+                self.config.job_max_attempts, self.config.job_retry_delay
+            )
+            self.handle_db = archive.database(self.config.archive_output, 'channel_handles', Data_Handle)
+            # 下載紀錄由所有設定檔共用，不同頻道重複發布的連結也不需重新下載
+            store = archive.media_store(self.config.archive_output, self.config.media_store) if self.config.media_store else None
+            self.manifest = archive.download_manifest(self.config.archive_output, store=store)
+            if self.config.backfill:
+                self.crawl_db = archive.database(self.config.archive_output, 'crawl_checkpoints', Data_Crawl)
+
+    def backfill_links(self):
+        """為連結表建立前紀錄、尚未下載的貼文補上連結分類，沒有可下載連結的貼文直接標記為已下載"""
+        condition, params = self.db.get_condition(Data_PostEnum.DOWNLOADED.value, Status.NOT_PROCESS)
+        condition = f'{condition} AND {Data_PostEnum.PID.value} NOT IN (SELECT {Data_LinkEnum.PID.value} FROM {self.link_db.table_name})'
+        rows = self.db.iter_rows([(condition, params)], [Data_PostEnum.PID.value, Data_PostEnum.LINKS.value], batch_size=RECORD_BATCH_SIZE)
+        for batch in chunked(rows, RECORD_BATCH_SIZE):
+            links = []
+            finished = []
+            for post in batch:
+                if data_convert.has_downloadable_links(post.links):
+                    links.extend(data_convert.convert_links_to_type(post.pid, post.links))
+                else:
+                    finished.append(post.pid)
+            self.link_db.save_new_posts(links)
+            self.db.update_status_many(Data_PostEnum.PID.value, finished, Data_PostEnum.DOWNLOADED.value, Status.FINISH.value)
+
+    def record_links(self, posts: list[Data_Post]):
+        """紀錄貼文連結分類，已有連結紀錄的貼文略過"""
+        existing = self.link_db.get_existing_values(Data_LinkEnum.PID.value, [post.pid for post in posts])
+        links = []
+        for post in posts:
+            if post.pid not in existing:
+                links.extend(data_convert.convert_links_to_type(post.pid, post.links))
+        self.link_db.save_new_posts(links)
 
     def get_posts(self):
-        """去除資料庫已有的貼文，並將貼文轉成Data_Post類型並儲存到self.data_posts"""
+        """去除資料庫已有的貼文，並將貼文轉成Data_Post類型，以生成器形式儲存到self.data_posts"""
+        skip_pids = self.get_known_pids()
+        known_pids = skip_pids if self.config.incremental and self.db else None
+        if self.config.bulk:
+            self.data_posts = self.iter_bulk_posts()
+        else:
+            self.data_posts = self.iter_new_posts(skip_pids, known_pids)
+
+    def enable_pid_cache(self):
+        """常駐執行時將已紀錄的貼文ID保留於記憶體，紀錄新貼文時同步更新"""
+        if self.db and self.pid_cache is None:
+            self.pid_cache = set(self.db.get_values_from_key(Data_PostEnum.PID.value))
+
+    def get_known_pids(self) -> graber.PidLookup:
+        """取得已紀錄貼文ID的查詢物件，有記憶體快取時直接使用，否則以資料庫索引查詢"""
+        if self.pid_cache is not None:
+            return self.pid_cache
+        if self.db:
+            return archive.key_lookup(self.db, Data_PostEnum.PID.value)
+        return set()
+
+    def iter_bulk_posts(self) -> Iterator[Data_Post]:
+        """批次讀取清單檔中的貼文，只交出資料庫中未紀錄的貼文"""
+        try:
+            links = graber.read_link_file(self.config.bulk)
+            known_pids = set()
+            if self.db:
+                known_pids = self.db.get_existing_values(Data_PostEnum.PID.value, graber.parse_post_ids(links))
+            for post_content in graber.iter_bulk_posts(links, self.config.cookies, self.config.bulk_workers, known_pids):
+                yield data_convert.convert_post_to_type(post_content)
+        except Exception as e:
+            log.error(f"批次讀取失敗：{e}\n")
+
+    def iter_new_posts(self, skip_pids: graber.PidLookup, known_pids: graber.PidLookup | None) -> Iterator[Data_Post]:
+        """逐則爬取貼文，只交出資料庫中未紀錄的貼文"""
+        checkpoint = None
+        spill_folder = ""
+        if self.crawl_db and self.db:
+            checkpoint = self.crawl_db.get_item('config_name', self.db.table_name) or Data_Crawl(config_name=self.db.table_name)
+            spill_folder = os.path.join(os.path.dirname(self.config.archive_output), 'backfill', self.db.table_name)
         try:
-            yt_posts: list[YT_Post] = graber.main(self.config.url, self.config.cookies)
+            contents = graber.iter_posts(
+                self.config.url,
+                self.config.cookies,
+                known_pids=known_pids,
+                overlap_pages=self.config.incremental_overlap,
+                checkpoint=checkpoint,
+                on_page=self.save_checkpoint,
+                spill_folder=spill_folder,
+                resolve_handle=self.resolve_handle,
+            )
+            for batch in chunked(contents, RECORD_BATCH_SIZE):
+                # 每批貼文以單次查詢確認是否已紀錄
+                existing = skip_pids.intersection(post_content['post_id'] for post_content in batch)
+                for post_content in batch:
+                    if post_content['post_id'] not in existing:
+                        yield data_convert.convert_post_to_type(post_content)
         except Exception as e:
             log.error(f"爬取失敗：{e}\n")
             return
+        if checkpoint:
+            self.clear_checkpoint(checkpoint, spill_folder)
 
-        skip_pids = []
-        _posts: list[Data_Post] = []
-        if self.db:
-            skip_pids = self.db.get_values_from_key('pid')
-        for post in yt_posts:
-            post_contetn = post.as_json()
-            if post_contetn['post_id'] in skip_pids:
-                continue
-            _posts.append(data_convert.convert_post_to_type(post_contetn))
-            self.data_posts = _posts # 清除已存在的貼文
+    def resolve_handle(self, channel_handle: str) -> str:
+        """將頻道標籤轉換為頻道ID，優先使用資料庫中未過期的快取"""
+        if self.handle_db:
+            cached = self.handle_db.get_item('handle', channel_handle)
+            if cached and time.time() - cached.updated < self.config.handle_cache_days * 86400:
+                return cached.channel_id
+        channel_id = graber.get_channel_id_from_handle(channel_handle)
+        if self.handle_db:
+            self.handle_db.upsert_item(Data_Handle(handle=channel_handle, channel_id=channel_id, updated=time.time()), 'handle')
+        return channel_id
+
+    def save_checkpoint(self, checkpoint: Data_Crawl):
+        """每頁讀取後紀錄翻頁進度"""
+        if self.crawl_db:
+            self.crawl_db.upsert_item(checkpoint, 'config_name')
+
+    def clear_checkpoint(self, checkpoint: Data_Crawl, spill_folder: str):
+        """全部貼文處理完畢後，清除翻頁進度與暫存頁面"""
+        if self.crawl_db:
+            self.crawl_db.delete_items('config_name', checkpoint.config_name)
+        if spill_folder:
+            shutil.rmtree(spill_folder, ignore_errors=True)
+        log.info(f"續傳爬取完成，清除翻頁進度：{checkpoint.config_name}")
 
     def record_posts(self):
+        if not self.db:
+            # 沒有資料庫時，後續流程需重複讀取貼文列表
+            self.data_posts = list(self.data_posts)
         if not self.db and not self.config.post_output:
             log.info("未設定儲存位置與資料庫位置，跳過儲存貼文")
             return
-        
-        log.info(f"未紀錄貼文數：{len(self.data_posts)}")
-        for post in self.data_posts:
+
+        for batch in chunked(self.data_posts, RECORD_BATCH_SIZE):
             if self.db:
-                self.db.save_new_post(post)
-                log.info(f"紀錄貼文：{post.pid}")
-
-            if self.config.enable_posts and self.config.post_output:
-                savepath = os.path.join(self.config.post_output, post.time)
-                os.makedirs(savepath, exist_ok=True)
-                # 儲存貼文
-                downloader.download_json(os.path.join(savepath, f"{post.pid}.json"), post.content)
-                log.info(f"儲存貼文：{post.pid}")
-                # 儲存貼文附件
-                asyncio.run(downloader.save_attachments(savepath, post.pid, post.links))
+                # 以單一交易紀錄整批貼文
+                self.new_post_count += self.db.save_new_posts(batch)
+                self.record_links(batch)
+                if self.pid_cache is not None:
+                    self.pid_cache.update(post.pid for post in batch)
+                log.info(f"紀錄貼文：{', '.join(post.pid for post in batch)}")
+            else:
+                self.new_post_count += len(batch)
+            for post in batch:
+                self.save_post_files(post)
+        self.wait_attachments()
+        log.info(f"紀錄貼文數：{self.new_post_count}")
+
+    def record_post(self, post: Data_Post) -> bool:
+        """紀錄單則貼文，回傳是否交給後續階段
+        資料庫已有該貼文時(重複爬取或貼文ID快取過期)回傳False，避免以未處理的狀態再次通知與下載
+        """
+        if post.id:
+            # 從資料庫讀出的待處理貼文，已紀錄過
+            return True
+        if self.db:
+            if not self.db.save_new_post(post):
+                log.info(f"貼文已存在，略過紀錄：{post.pid}")
+                return False
+            log.info(f"紀錄貼文：{post.pid}")
+            self.record_links([post])
+            if self.pid_cache is not None:
+                self.pid_cache.add(post.pid)
+        self.new_post_count += 1
+        self.save_post_files(post)
+        return True
+
+    def save_post_files(self, post: Data_Post):
+        """儲存貼文json與附件"""
+        if self.config.enable_posts and self.config.post_output:
+            savepath = os.path.join(self.config.post_output, post.time)
+            os.makedirs(savepath, exist_ok=True)
+            # 儲存貼文
+            downloader.download_json(os.path.join(savepath, f"{post.pid}.json"), post.content)
+            log.info(f"儲存貼文：{post.pid}")
+            # 儲存貼文附件，排入共用的事件迴圈後繼續處理下一則貼文
+            attachments = downloader.get_attachment_downloader(self.config.attachment_concurrency)
+            self.attachment_futures.append(attachments.submit(savepath, post.pid, post.links, self.manifest))
+
+    def wait_attachments(self):
+        """等待已排入的附件下載完成"""
+        futures, self.attachment_futures = self.attachment_futures, []
+        for future in wait(futures).done:
+            if future.exception():
+                log.error(f"下載附件失敗：{future.exception()}")
+
+    @property
+    def notify_enabled(self) -> bool:
+        return bool(self.config.discord_original_token)
+
+    @property
+    def translate_enabled(self) -> bool:
+        return bool(self.config.enable_translate and \
+            self.config.chatgpt_apikey and \
+            self.config.chatgpt_model and \
+            self.config.discord_translated_token)
+
+    @property
+    def media_enabled(self) -> bool:
+        return bool(self.config.enable_media and self.config.media_output)
 
     def notify_posts(self):
         """發送原文貼文至Discord"""
-        if not self.config.discord_original_token:
+        if not self.notify_enabled:
             return
         log.info(f"開始讀取待通知貼文...")
+        condition = None
         if self.db:
-            self.data_posts = self.db.get_specific_list(Data_PostEnum.ORIGIN_NOTIFY.value, Status.NOT_PROCESS)
-            log.info(f"未通知原文貼文數：{len(self.data_posts)}")
-        for post in self.data_posts:
-            log.info(f"通知貼文：{post.pid}")
-            try:
-                post_parser = PostParser(post.content)
-                notify.send_post(self.config.discord_original_token, post_parser)
-                if self.db:
-                    self.db.insert_post_data(Data_PostEnum.PID.value, post.pid, Data_PostEnum.ORIGIN_NOTIFY.value, Status.FINISH.value)
-            except Exception as e:
-                log.error(f"通知失敗，PID：{post.pid}")
-                log.error(f"通知貼文失敗：{e}")
+            condition = self.db.get_condition(Data_PostEnum.ORIGIN_NOTIFY.value, Status.NOT_PROCESS)
+            log.info(f"未通知原文貼文數：{self.db.count_rows(*condition)}")
+        self.run_stage(Data_PostEnum.ORIGIN_NOTIFY.value, self.notify_post, condition, NOTIFY_COLUMNS)
+
+    def notify_post(self, post: Data_Post):
+        if post.origin_notify == Status.FINISH:
+            return
+        log.info(f"通知貼文：{post.pid}")
+        try:
+            post_parser = data_convert.get_post_parser(post)
+            notify.send_post(self.config.discord_original_token, post_parser)
+            if self.db:
+                self.db.insert_post_data(Data_PostEnum.PID.value, post.pid, Data_PostEnum.ORIGIN_NOTIFY.value, Status.FINISH.value)
+        except Exception as e:
+            log.error(f"通知失敗，PID：{post.pid}")
+            log.error(f"通知貼文失敗：{e}")
+            raise
 
     def translate_posts(self):
         """發送翻譯貼文至Discord"""
-        if not self.config.enable_translate or \
-            not self.config.chatgpt_apikey or \
-            not self.config.chatgpt_model or \
-            not self.config.discord_translated_token:
+        if not self.translate_enabled:
             return
         log.info(f"開始讀取待翻譯貼文...")
+        condition = None
         if self.db:
-            self.data_posts = self.db.get_specific_list(Data_PostEnum.TRANSLATE_NOTIFY.value, Status.NOT_PROCESS)
-            log.info(f"未通知翻譯貼文數：{len(self.data_posts)}")
+            condition = self.db.get_condition(Data_PostEnum.TRANSLATE_NOTIFY.value, Status.NOT_PROCESS)
+            log.info(f"未通知翻譯貼文數：{self.db.count_rows(*condition)}")
         gpt = translate.Chatgpt(self.config.chatgpt_apikey, self.config.chatgpt_model)
-        for post in self.data_posts:
-            log.info(f"通知貼文：{post.pid}")
-            try:
-                post_parser = PostParser(post.content)
-                # 翻譯貼文
-                content = ""
-                for text in discord.split_text(post_parser.content_text, discord.DESCRIPTION_LIMIT):
-                    if text:
-                        content += gpt.translate(text) + "\n"
-                post_parser.content_text = content.strip()
-                if post_parser.video:
-                    # 翻譯影片介紹
-                    post_parser.video.description = gpt.translate(post_parser.video.description)
-                notify.send_post(self.config.discord_translated_token, post_parser)
-                if self.db:
-                    self.db.insert_post_data(Data_PostEnum.PID.value, post.pid, Data_PostEnum.TRANSLATE_NOTIFY.value, Status.FINISH.value)
-            except Exception as e:
-                log.error(f"通知失敗，PID：{post.pid}")
-                log.error(f"通知貼文失敗：{e}")
-        
+        self.run_stage(Data_PostEnum.TRANSLATE_NOTIFY.value, lambda post: self.translate_post(post, gpt), condition, TRANSLATE_COLUMNS)
+
+    def translate_post(self, post: Data_Post, gpt: translate.Chatgpt):
+        if post.translate_notify == Status.FINISH:
+            return
+        log.info(f"通知貼文：{post.pid}")
+        try:
+            post_parser = data_convert.get_post_parser(post)
+            # 翻譯貼文
+            content = ""
+            for text in discord.split_text(post_parser.content_text, discord.DESCRIPTION_LIMIT):
+                if text:
+                    content += gpt.translate(text) + "\n"
+            post_parser.content_text = content.strip()
+            if post_parser.video:
+                # 翻譯影片介紹
+                post_parser.video.description = gpt.translate(post_parser.video.description)
+            notify.send_post(self.config.discord_translated_token, post_parser)
+            if self.db:
+                self.db.insert_post_data(Data_PostEnum.PID.value, post.pid, Data_PostEnum.TRANSLATE_NOTIFY.value, Status.FINISH.value)
+        except Exception as e:
+            log.error(f"通知失敗，PID：{post.pid}")
+            log.error(f"通知貼文失敗：{e}")
+            raise
+
     def dl_media(self):
-        if not self.config.enable_media or not self.config.media_output:
+        if not self.media_enabled:
             return
 
         log.info(f"開始讀取待下載媒體貼文...")
+        condition = None
         if self.db:
-            self.data_posts = self.db.get_specific_list(Data_PostEnum.DOWNLOADED.value, Status.NOT_PROCESS)
-            log.info(f"未下載媒體貼文數：{len(self.data_posts)}")
-        for post in self.data_posts:
-            log.info(f"下載媒體貼文：{post.pid}")
+            condition = self.get_download_condition()
+            log.info(f"未下載媒體貼文數：{self.db.count_rows(*condition)}")
+        self.run_stage(Data_PostEnum.DOWNLOADED.value, self.dl_post_media, condition, DOWNLOAD_COLUMNS)
+
+    def get_download_condition(self) -> tuple[str, list]:
+        """未下載且含有可下載連結的貼文"""
+        condition, params = self.db.get_condition(Data_PostEnum.DOWNLOADED.value, Status.NOT_PROCESS)
+        link_condition, link_params = self.db.get_related_condition(
+            Data_PostEnum.PID.value, self.link_db, Data_LinkEnum.PID.value,
+            Data_LinkEnum.KIND.value, [kind.value for kind in DOWNLOADABLE_KINDS]
+        )
+        return f'{condition} AND {link_condition}', params + link_params
+
+    def dl_post_media(self, post: Data_Post):
+        if post.downloaded == Status.FINISH:
+            return
+        log.info(f"下載媒體貼文：{post.pid}")
+        try:
+            success, error, unknown  = downloader.download_links(self.config.media_output, post.links, self.manifest, self.config.download_segments)
+            if success or error or unknown:
+                log.info(f"[PID:{post.pid}]下載狀態總結：{len(success)} 個成功，{len(error)} 個失敗，{len(unknown)} 個未知")
+            if self.db and not error:
+                self.db.insert_post_data(Data_PostEnum.PID.value, post.pid, Data_PostEnum.DOWNLOADED.value, Status.FINISH.value)
+            else:
+                for f in error:
+                    log.error(f"[PID:{post.pid}]下載失敗：{f.url}")
+            for f in unknown:
+                log.warning(f"[PID:{post.pid}]未知檔案名稱，需檢查是否下載成功：{f.url}")
+            if self.config.discord_download_token:
+                notify.send_media(self.config.discord_download_token, data_convert.get_post_parser(post), success, error, unknown, self.manifest.store if self.manifest else None)
+        except Exception as e:
+            log.error(f"[PID:{post.pid}]下載媒體貼文失敗")
+            raise
+        if error:
+            raise Exception(f"{len(error)} 個連結下載失敗")
+
+    def run_stage(self, stage: str, handler: Callable[[Data_Post], None], condition: tuple[str, list] | None, columns: list[str]):
+        """執行單一階段
+        有資料庫時將未完成的貼文加入工作表，逐批取得處理權後處理，失敗的貼文依失敗次數延後重試
+        """
+        if not self.jobs:
+            for post in self.data_posts:
+                self.process_post(stage, handler, post)
+            return
+        self.jobs.enqueue_pending(stage, self.db, *condition)
+        while jobs := self.jobs.claim(stage, self.worker_id, RECORD_BATCH_SIZE, self.config.job_lease_seconds):
+            pids = [job.pid for job in jobs]
+            placeholders = ', '.join(['?'] * len(pids))
+            posts = {post.pid: post for post in self.db.iter_rows([(f'{Data_PostEnum.PID.value} IN ({placeholders})', pids)], columns)}
+            for job in jobs:
+                self.run_job(job, handler, posts.get(job.pid))
+
+    def process_post(self, stage: str, handler: Callable[[Data_Post], None], post: Data_Post):
+        """處理單則貼文的單一階段，有資料庫時先取得該貼文的處理權"""
+        if getattr(post, stage) == Status.FINISH:
+            return
+        if not self.jobs:
             try:
-                success, error, unknown  = downloader.download_links(self.config.media_output, post.links)
-                if success or error or unknown:
-                    log.info(f"[PID:{post.pid}]下載狀態總結：{len(success)} 個成功，{len(error)} 個失敗，{len(unknown)} 個未知")
-                if self.db and not error:
-                    self.db.insert_post_data(Data_PostEnum.PID.value, post.pid, Data_PostEnum.DOWNLOADED.value, Status.FINISH.value)
-                else:
-                    for f in error:
-                        log.error(f"[PID:{post.pid}]下載失敗：{f.url}")
-                for f in unknown:
-                    log.warning(f"[PID:{post.pid}]未知檔案名稱，需檢查是否下載成功：{f.url}")
-                if self.config.discord_download_token:
-                    notify.send_media(self.config.discord_download_token, PostParser(post.content), success, error, unknown)
-            except Exception as e:
-                log.error(f"[PID:{post.pid}]下載媒體貼文失敗")
+                handler(post)
+            except Exception:
+                pass # 錯誤已由各階段紀錄
+            return
+        job = self.jobs.claim_pid(stage, post.pid, self.worker_id, self.config.job_lease_seconds)
+        if not job:
+            log.debug(f"貼文 {post.pid} 的 {stage} 階段尚未到重試時間或由其他程序處理中")
+            return
+        # 完成的工作會從工作表刪除，claim_pid 可能重新建立已完成階段的工作，需以資料庫中的狀態為準
+        row = next(self.db.iter_rows([(f'{Data_PostEnum.PID.value} = ?', [post.pid])], [stage]), None)
+        if row is None or getattr(row, stage) == Status.FINISH:
+            self.jobs.complete(job)
+            return
+        self.run_job(job, handler, post)
 
-def main():
-    log.info(f"開始執行主程式...")
-    log.info(__description__)
-    configs = load_channels.loading_configs()
+    def run_job(self, job: Data_Job, handler: Callable[[Data_Post], None], post: Data_Post | None):
+        if post is None or getattr(post, job.stage) == Status.FINISH:
+            self.jobs.complete(job)
+            return
+        # 同批的前面工作可能已耗用大部分處理時間，處理前續約，處理權已被其他程序接手時略過
+        if not self.jobs.renew(job, self.config.job_lease_seconds):
+            log.warning(f"[PID:{post.pid}]處理權已由其他程序接手，略過 {job.stage} 階段")
+            return
+        try:
+            handler(post)
+        except Exception as e:
+            self.jobs.fail(job, str(e))
+            return
+        self.jobs.complete(job)
+
+    def iter_pending_posts(self) -> Iterator[Data_Post]:
+        """讀取資料庫中尚有已啟用階段未完成的貼文"""
+        if not self.db:
+            return
+        status_keys = []
+        if self.notify_enabled:
+            status_keys.append(Data_PostEnum.ORIGIN_NOTIFY.value)
+        if self.translate_enabled:
+            status_keys.append(Data_PostEnum.TRANSLATE_NOTIFY.value)
+        if self.media_enabled:
+            status_keys.append(Data_PostEnum.DOWNLOADED.value)
+        if status_keys:
+            yield from self.db.iter_any_specific(status_keys, Status.NOT_PROCESS, PIPELINE_COLUMNS)
+
+    def run_pipeline(self):
+        """以串流管線執行各階段，每則貼文完成前一階段後即進入下一階段"""
+        stages = [pipeline.Stage("record", self.record_post)]
+        if self.notify_enabled:
+            # 通知只使用單一執行緒，保持貼文發送順序
+            stages.append(pipeline.Stage("notify", lambda post: self.process_post(Data_PostEnum.ORIGIN_NOTIFY.value, self.notify_post, post)))
+        if self.translate_enabled:
+            gpt = translate.Chatgpt(self.config.chatgpt_apikey, self.config.chatgpt_model)
+            translate_post = lambda post: self.translate_post(post, gpt)
+            # 翻譯後即發送通知，與原文通知相同只使用單一執行緒，保持貼文發送順序
+            stages.append(pipeline.Stage("translate", lambda post: self.process_post(Data_PostEnum.TRANSLATE_NOTIFY.value, translate_post, post)))
+        if self.media_enabled:
+            stages.append(pipeline.Stage("download", lambda post: self.process_post(Data_PostEnum.DOWNLOADED.value, self.dl_post_media, post), self.config.stage_workers))
+        self.get_posts()
+        source = itertools.chain(self.iter_pending_posts(), self.data_posts)
+        count = pipeline.run_pipeline(source, stages, self.config.pipeline_queue_size)
+        self.wait_attachments()
+        log.info(f"管線處理貼文數：{count}")
+
+    def run(self) -> int:
+        """執行單一設定檔的各階段作業，回傳新增的貼文數量"""
+        self.new_post_count = 0
+        if self.config.pipeline:
+            self.run_pipeline()
+        else:
+            self.get_posts()
+            self.record_posts()
+            self.notify_posts()
+            self.translate_posts()
+            self.dl_media()
+        return self.new_post_count
+
+def run_station(config: load_channels.params.FileParams):
+    log.info(f"取得設定檔：{config.config_name}")
+    log.info(f"網址：{config.url}")
+    station = work_station(config)
+    station.run()
+    log.info(f"設定檔：{config.config_name} 作業完成！\n")
+
+def create_daemon_station(config: load_channels.params.FileParams) -> work_station:
+    """常駐執行用的work_station，保留貼文ID快取並強制增量爬取，每次檢查只讀取新貼文的頁面"""
+    if not config.incremental:
+        log.warning(f"設定檔：{config.config_name} 常駐執行時改為增量爬取")
+        config.incremental = True
+    if not config.enable_archive:
+        log.warning(f"設定檔：{config.config_name} 未啟用紀錄，無法增量爬取，每次檢查都會讀取所有貼文")
+    station = work_station(config)
+    station.enable_pid_cache()
+    return station
+
+def run_daemon(configs: list[load_channels.params.FileParams], args: load_channels.params.AllParams):
+    """常駐執行，保留各設定檔的work_station並依發文頻率調整檢查間隔"""
+    jobs = []
     for config in configs:
         log.info(f"取得設定檔：{config.config_name}")
-        log.info(f"網址：{config.url}")
+        station = create_daemon_station(config)
+        jobs.append(scheduler.PollJob(name=config.config_name, run=station.run, interval=args.poll_interval))
+    log.info(f"常駐執行設定檔數量：{len(jobs)}")
+    try:
+        scheduler.run_forever(jobs, args.poll_min_interval, args.poll_max_interval, args.workers)
+    except KeyboardInterrupt:
+        log.info(f"停止常駐執行")
+
+class leased_worker:
+    """監督模式下的工作程序
+    依一致性雜湊負責部分設定檔，負責的程序停止心跳後，其他程序取得設定檔租約接手執行
+    """
+    def __init__(self, index: int, count: int, args: load_channels.params.AllParams) -> None:
+        self.index = index
+        self.args = args
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.ring = supervisor.HashRing(range(count))
+        self.leases = archive.lease_table(args.archive_output)
+        self.stations: dict[str, work_station] = {}
+        self.running: set[str] = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def worker_lease(index: int) -> str:
+        return f"worker:{index}"
+
+    def heartbeat(self):
+        """定期續約工作程序與執行中設定檔的租約"""
+        while True:
+            self.leases.acquire(self.worker_lease(self.index), self.owner, self.args.lease_seconds)
+            with self.lock:
+                running = list(self.running)
+            for name in running:
+                self.leases.acquire(name, self.owner, self.args.lease_seconds)
+            time.sleep(self.args.lease_seconds / 3)
+
+    def run_config(self, config: load_channels.params.FileParams) -> int | None:
+        """取得設定檔租約後執行，非本程序負責的設定檔只在負責程序停止時執行
+        未執行時回傳None，排程不依此調整輪詢間隔
+        """
+        owner_index = self.ring.get(config.config_name)
+        if owner_index != self.index and self.leases.is_alive(self.worker_lease(owner_index)):
+            return None
+        name = f"config:{config.config_name}"
+        if not self.leases.acquire(name, self.owner, self.args.lease_seconds):
+            return None
+        if owner_index != self.index:
+            log.warning(f"工作程序 {owner_index} 已停止，由工作程序 {self.index} 接手設定檔：{config.config_name}")
+        with self.lock:
+            self.running.add(name)
+        try:
+            if config.config_name not in self.stations:
+                self.stations[config.config_name] = create_daemon_station(config)
+            return self.stations[config.config_name].run()
+        finally:
+            with self.lock:
+                self.running.discard(name)
+            self.leases.release(name, self.owner)
+
+    def run(self, configs: list[load_channels.params.FileParams]):
+        threading.Thread(target=self.heartbeat, name=f"heartbeat-{self.index}", daemon=True).start()
+        owned = [config.config_name for config in configs if self.ring.get(config.config_name) == self.index]
+        log.info(f"工作程序 {self.index} 負責設定檔：{', '.join(owned) or '無'}")
+        jobs = [
+            # 非本程序負責的設定檔依租約時間固定檢查，負責程序停止後約在租約到期時接手
+            scheduler.PollJob(
+                name=config.config_name,
+                run=lambda config=config: self.run_config(config),
+                interval=self.args.poll_interval,
+                skip_interval=self.args.lease_seconds / 2,
+            )
+            for config in configs
+        ]
+        scheduler.run_forever(jobs, self.args.poll_min_interval, self.args.poll_max_interval, self.args.workers)
+
+def configure_rate_limit(args: load_channels.params.AllParams):
+    """依執行參數設定各主機的請求間隔，限制由同一程序的所有設定檔共用"""
+    limiter.configure({
+        'youtube.com': args.youtube_interval,
+        'discord.com': args.discord_interval,
+        'discordapp.com': args.discord_interval,
+        'mediafire.com': args.mediafire_interval,
+    })
+
+def run_worker(index: int, count: int, configs: list[load_channels.params.FileParams], args: load_channels.params.AllParams):
+    # 工作程序各自擁有限制器，啟動時重新套用設定
+    configure_rate_limit(args)
+    try:
+        leased_worker(index, count, args).run(configs)
+    except KeyboardInterrupt:
+        pass
+
+def migrate_compress(configs: list[load_channels.params.FileParams]):
+    """將各設定檔儲存表中既有的貼文內容轉換為壓縮格式，完成後整理資料庫空間"""
+    databases: dict[str, archive.database] = {}
+    for config in configs:
+        if not config.enable_archive:
+            continue
+        config.compress_content = True
         station = work_station(config)
-        station.get_posts()
-        station.record_posts()
-        station.notify_posts()
-        station.translate_posts()
-        station.dl_media()
-        log.info(f"設定檔：{config.config_name} 作業完成！\n")
+        station.db.migrate_compress()
+        if config.archive_output in databases:
+            databases[config.archive_output].close()
+        databases[config.archive_output] = station.db
+    for path, db in databases.items():
+        log.info(f"整理資料庫空間：{path}")
+        db.vacuum()
+        db.close()
+
+def main():
+    log.info(f"開始執行主程式...")
+    log.info(__description__)
+    args = setting.get_config()
+    configure_rate_limit(args)
+    if args.bulk:
+        # 批次下載以清單檔名作為儲存表名稱
+        configs = [load_channels.params.FileParams(**asdict(args), config_name=os.path.basename(args.bulk))]
+    else:
+        configs = load_channels.loading_configs()
+    workers = args.workers
+    if args.migrate_compress:
+        migrate_compress(configs)
+    elif args.supervisor_workers > 0:
+        log.info(f"監督模式工作程序數量：{args.supervisor_workers}")
+        supervisor.supervise(args.supervisor_workers, run_worker, (configs, args))
+    elif args.daemon:
+        run_daemon(configs, args)
+    elif workers <= 1:
+        for config in configs:
+            run_station(config)
+    else:
+        log.info(f"同時執行設定檔數量：{workers}")
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="station") as executor:
+            futures = {executor.submit(run_station, config): config for config in configs}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    log.error(f"設定檔：{futures[future].config_name} 執行失敗：{e}")
     log.info(f"執行主程式結束")
 
 if __name__ == "__main__":
+    # 打包執行檔以 spawn 啟動工作程序時，子程序在此進入工作程序而不重新執行主程式
+    multiprocessing.freeze_support()
     main()
-
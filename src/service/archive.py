@@ -1,9 +1,17 @@
 import os
 import json
+import time
 import sqlite3
 import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, get_origin
 from dataclasses import asdict, fields
 
+from src.utils import json_codec
+from src.app_types.database import Status, Data_Job, Data_Lease, Data_Download, Data_Blob
+from src.utils.tools import canonical_url, get_size
+
 log = logging.getLogger(__name__)
 
 python_to_sqlite = {
@@ -21,6 +29,23 @@ def replace_illegal_characters(word):
     word = word.replace('()', '<>')
     return word
 
+def convert_bool(value) -> bool:
+    return value in ('1', 1, 'True', 'true', True)
+
+def convert_list(value) -> list:
+    try:
+        return json.loads(value)
+    except (TypeError, json.JSONDecodeError):
+        return []
+
+def convert_dict(value) -> dict:
+    if json_codec.is_encoded(value):
+        return json_codec.decode(value)
+    try:
+        return json.loads(value)
+    except (TypeError, json.JSONDecodeError):
+        return {}
+
 def serialize_value(value):
     '''將值序列化為字符串'''
     if isinstance(value, (dict, list)):
@@ -31,13 +56,38 @@ def serialize_value(value):
     
 class database:
     '''使用dataclass作為儲存格式'''
-    def __init__(self, path: str, table_name: str, dataclass_cls: type):
+    def __init__(self, path: str, table_name: str, dataclass_cls: type, compress: bool = False):
         self.path = path
         self.table_name = replace_illegal_characters(table_name)
         self.dataclass_cls = dataclass_cls
+        # 啟用時，metadata 設定 compress 的欄位以壓縮格式儲存，讀取時不論是否啟用皆自動解壓縮
+        self.compress_columns = [f.name for f in fields(dataclass_cls) if f.metadata.get("compress")] if compress else []
         self.skip_auto_key = ""
+        self.lock = threading.RLock()
+        self.connect()
         self.create_new_table()
 
+    def connect(self):
+        """建立長期使用的連線，使用WAL模式讓讀寫可同時進行"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA cache_size=-16000")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA busy_timeout=30000")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """取得共用連線並包在單一交易中，結束時提交，發生例外時回滾"""
+        with self.lock:
+            with self.conn:
+                yield self.conn
+
     def create_new_table(self):
         log.info(f'選擇儲存表："{self.table_name}"')
         columns = []
@@ -48,21 +98,121 @@ class database:
                 self.skip_auto_key = col
             columns.append(f"{col} {sql_type} {sql_command}".strip())
         command = f"CREATE TABLE IF NOT EXISTS {self.table_name} ({', '.join(columns)})"
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        with sqlite3.connect(self.path) as conn:
+        with self.transaction() as conn:
             conn.cursor().execute(command)
+        self.add_missing_columns()
+        self.create_indexes()
+
+    def add_missing_columns(self):
+        """為舊版建立的儲存表補上dataclass新增的欄位，舊資料的新欄位為NULL"""
+        with self.transaction() as conn:
+            existing = {row[1] for row in conn.execute(f'PRAGMA table_info({self.table_name})')}
+            for col, py_type in self.dataclass_cls.__annotations__.items():
+                if col in existing:
+                    continue
+                log.info(f'儲存表 "{self.table_name}" 新增欄位：{col}')
+                conn.execute(f'ALTER TABLE {self.table_name} ADD COLUMN {col} {python_to_sqlite.get(py_type, "TEXT")}')
+
+    def create_indexes(self):
+        """依dataclass欄位的index設定建立索引
+        pending_index 設定的欄位建立只包含待處理狀態的部分索引
+        """
+        for f in fields(self.dataclass_cls):
+            if "pending_index" in f.metadata:
+                with self.transaction() as conn:
+                    conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_{f.name}_pending "
+                        f"ON {self.table_name} (id) WHERE {f.name} = {int(f.metadata['pending_index'])}"
+                    )
+            index_type = f.metadata.get("index")
+            if not index_type:
+                continue
+            index_name = f"idx_{self.table_name}_{f.name}"
+            with self.transaction() as conn:
+                if index_type == "UNIQUE":
+                    if self.get_index_unique(conn, index_name):
+                        continue
+                    # 舊版可能有重複資料或同名的一般索引，清除後改建唯一索引
+                    self.remove_duplicates(conn, f.name)
+                    conn.execute(f"DROP INDEX IF EXISTS {index_name}")
+                    conn.execute(f"CREATE UNIQUE INDEX {index_name} ON {self.table_name} ({f.name})")
+                else:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {self.table_name} ({f.name})")
+
+    def remove_duplicates(self, conn: sqlite3.Connection, key: str):
+        """刪除指定欄位重複的資料，保留最早紀錄的一筆，建立唯一索引前使用
+        刪除前先將重複資料中已完成的狀態併入保留的一筆，避免已處理的貼文再次通知或下載
+        """
+        kept = f'SELECT MIN(id) FROM {self.table_name} GROUP BY {key} HAVING COUNT(*) > 1'
+        for f in fields(self.dataclass_cls):
+            if isinstance(f.default, Status):
+                conn.execute(
+                    f'UPDATE {self.table_name} SET {f.name} = '
+                    f'(SELECT MAX(d.{f.name}) FROM {self.table_name} AS d WHERE d.{key} = {self.table_name}.{key}) '
+                    f'WHERE id IN ({kept})'
+                )
+        removed = conn.execute(
+            f'DELETE FROM {self.table_name} WHERE id NOT IN (SELECT MIN(id) FROM {self.table_name} GROUP BY {key})'
+        ).rowcount
+        if removed:
+            log.warning(f'儲存表 "{self.table_name}" 的 {key} 欄位有重複資料，刪除較晚紀錄的 {removed} 筆')
+
+    def get_index_unique(self, conn: sqlite3.Connection, index_name: str) -> bool | None:
+        """回傳指定名稱的索引是否為唯一索引，索引不存在時回傳None"""
+        for row in conn.execute(f'PRAGMA index_list({self.table_name})'):
+            if row[1] == index_name:
+                return bool(row[2])
+        return None
 
-    def save_new_post(self, item):
+    def get_insert_values(self, item) -> tuple[list[str], list]:
+        """取得新增資料用的欄位名稱與序列化後的值"""
         data = asdict(item)
         if self.skip_auto_key in data.keys():
             # 刪除自增主鍵
             del data[self.skip_auto_key]
-        columns = ', '.join(data.keys())
-        placeholders = ', '.join(['?'] * len(data))
-        values = [serialize_value(v) for v in data.values()]
-        sql = f'INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders})'
-        with sqlite3.connect(self.path) as conn:
-            conn.execute(sql, values)
+        values = [
+            json_codec.encode(v) if k in self.compress_columns else serialize_value(v)
+            for k, v in data.items()
+        ]
+        return list(data.keys()), values
+
+    def get_insert_sql(self, columns: list[str]) -> str:
+        placeholders = ', '.join(['?'] * len(columns))
+        return f'INSERT OR IGNORE INTO {self.table_name} ({", ".join(columns)}) VALUES ({placeholders})'
+
+    def save_new_post(self, item) -> bool:
+        """新增資料，唯一欄位重複時略過，回傳是否新增成功"""
+        columns, values = self.get_insert_values(item)
+        with self.transaction() as conn:
+            return conn.execute(self.get_insert_sql(columns), values).rowcount == 1
+
+    def save_new_posts(self, items: Iterable) -> int:
+        """以單一交易批次新增資料，唯一欄位重複時略過，回傳新增筆數"""
+        rows = [self.get_insert_values(item) for item in items]
+        if not rows:
+            return 0
+        columns = rows[0][0]
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(self.get_insert_sql(columns), [values for _, values in rows])
+            return conn.total_changes - before
+
+    def get_existing_values(self, key: str, values: Iterable) -> set:
+        """以單次查詢(每批最多500筆)確認哪些值已存在於指定欄位"""
+        values = list(values)
+        existing = set()
+        with self.transaction() as conn:
+            for start in range(0, len(values), 500):
+                batch = values[start:start + 500]
+                placeholders = ', '.join(['?'] * len(batch))
+                cursor = conn.execute(f'SELECT {key} FROM {self.table_name} WHERE {key} IN ({placeholders})', batch)
+                existing.update(row[0] for row in cursor)
+        return existing
+
+    def has_value(self, key: str, value) -> bool:
+        with self.transaction() as conn:
+            cursor = conn.execute(f'SELECT 1 FROM {self.table_name} WHERE {key} = ? LIMIT 1', (serialize_value(value),))
+            return cursor.fetchone() is not None
 
     def get_values_from_key(self, key: str) -> list:
         """ 取得指定key的所有值
@@ -72,7 +222,7 @@ class database:
         for col, py_type in self.dataclass_cls.__annotations__.items():
             if col == key:
                 break
-        with sqlite3.connect(self.path) as conn:
+        with self.transaction() as conn:
             for data in conn.cursor().execute(f"SELECT {key} FROM {self.table_name}"):
                 raw_value = data[0]
                 if py_type == bool:
@@ -86,46 +236,448 @@ class database:
                     values.append(py_type(raw_value))
         return values
 
+    def get_condition(self, keyword, data_value) -> tuple[str, list]:
+        """產生查詢條件
+        查詢部分索引的待處理狀態時直接寫入數值，參數化的條件無法使用部分索引
+        """
+        field = self.dataclass_cls.__dataclass_fields__.get(keyword)
+        if field and "pending_index" in field.metadata and \
+            isinstance(data_value, int) and data_value == field.metadata["pending_index"]:
+            return f'{keyword} = {int(data_value)}', []
+        return f'{keyword} = ?', [serialize_value(data_value)]
+
     def get_specific_list(self, keyword, data_value) -> list:
-        with sqlite3.connect(self.path) as conn:
+        condition, params = self.get_condition(keyword, data_value)
+        with self.transaction() as conn:
             cursor = conn.execute(
-                f'SELECT * FROM {self.table_name} WHERE {keyword} = ?',
-                (serialize_value(data_value),)
+                f'SELECT * FROM {self.table_name} WHERE {condition} ORDER BY id',
+                params
             )
-            col_names = [desc[0] for desc in cursor.description]
-            data = cursor.fetchall()
+            return self.convert_rows(cursor)
 
-            # 預先建立欄位型別對照表
-            field_types = {f.name: f.type for f in fields(self.dataclass_cls)}
+    def get_converters(self) -> dict[str, Callable]:
+        """建立欄位型別轉換對照表"""
+        converters = {}
+        for f in fields(self.dataclass_cls):
+            expected_type = f.type
+            if expected_type == bool:
+                converters[f.name] = convert_bool
+            elif expected_type in (list, dict) or get_origin(expected_type) in (list, dict):
+                converters[f.name] = convert_dict if dict in (expected_type, get_origin(expected_type)) else convert_list
+            else:
+                # 可擴充其他型別（如 datetime 等）
+                converters[f.name] = None
+        return converters
 
-            results = []
-            for row in data:
-                row_dict = dict(zip(col_names, row))
+    def convert_rows(self, cursor: sqlite3.Cursor) -> list:
+        """將查詢結果轉換成dataclass列表"""
+        col_names = [desc[0] for desc in cursor.description]
+        data = cursor.fetchall()
 
-                for name, val in row_dict.items():
-                    expected_type = field_types.get(name)
-                    if expected_type is None:
-                        continue
+        converters = self.get_converters()
+        results = []
+        for row in data:
+            row_dict = dict(zip(col_names, row))
+            for name, val in row_dict.items():
+                # 將資料轉換成對應的 dataclass 欄位型別
+                if converter := converters.get(name):
+                    row_dict[name] = converter(val)
+            results.append(self.dataclass_cls(**row_dict))
 
-                    # 將資料轉換成對應的 dataclass 欄位型別
-                    if expected_type == bool:
-                        row_dict[name] = val in ('1', 1, 'True', 'true', True)
-                    elif expected_type == list or expected_type == dict:
-                        try:
-                            row_dict[name] = json.loads(val)
-                        except (TypeError, json.JSONDecodeError):
-                            row_dict[name] = [] if expected_type == list else {}
-                    else:
-                        # 可擴充其他型別（如 datetime 等）
-                        row_dict[name] = val
+        return results
 
-                results.append(self.dataclass_cls(**row_dict))
+    def iter_rows(self, conditions: list[tuple[str, list]], columns: list[str] | None = None, batch_size: int = 200, after_id: int = 0) -> Iterator["lazy_row"]:
+        """以 id 分頁逐批讀取符合任一條件的資料，每批查詢完即釋放連線
+        columns 指定讀取的欄位(id 一定會讀取)，JSON 欄位在第一次存取時才解碼
+        """
+        select_columns = ', '.join(['id'] + [c for c in columns if c != 'id']) if columns else '*'
+        if len(conditions) == 1:
+            where = conditions[0][0]
+        else:
+            # 以 UNION 分別查詢各欄位，讓每個條件都能使用各自的部分索引
+            where = 'id IN (' + ' UNION '.join(f'SELECT id FROM {self.table_name} WHERE {c}' for c, _ in conditions) + ')'
+        params = [param for _, condition_params in conditions for param in condition_params]
+        converters = self.get_converters()
+        last_id = after_id
+        while True:
+            with self.transaction() as conn:
+                cursor = conn.execute(
+                    f'SELECT {select_columns} FROM {self.table_name} WHERE ({where}) AND id > ? ORDER BY id LIMIT ?',
+                    params + [last_id, batch_size]
+                )
+                col_names = [desc[0] for desc in cursor.description]
+                rows = cursor.fetchall()
+            for row in rows:
+                item = lazy_row(dict(zip(col_names, row)), converters)
+                last_id = item.id
+                yield item
+            if len(rows) < batch_size:
+                return
+
+    def iter_any_specific(self, keywords: list[str], data_value, columns: list[str] | None = None, batch_size: int = 200) -> Iterator["lazy_row"]:
+        """逐批讀取任一指定欄位符合數值的資料"""
+        return self.iter_rows([self.get_condition(keyword, data_value) for keyword in keywords], columns, batch_size)
+
+    def get_related_condition(self, keyword: str, related: "database", related_key: str, filter_key: str, filter_values: list) -> tuple[str, list]:
+        """產生 keyword 存在於其他儲存表查詢結果中的條件"""
+        placeholders = ', '.join(['?'] * len(filter_values))
+        return (
+            f'{keyword} IN (SELECT {related_key} FROM {related.table_name} WHERE {filter_key} IN ({placeholders}))',
+            [serialize_value(value) for value in filter_values]
+        )
+
+    def count_rows(self, condition: str, params: list) -> int:
+        with self.transaction() as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM {self.table_name} WHERE {condition}', params).fetchone()[0]
+
+    def migrate_compress(self, batch_size: int = 500) -> int:
+        """將既有資料的壓縮欄位轉換為壓縮格式，回傳轉換筆數"""
+        if not self.compress_columns:
+            return 0
+        columns = ', '.join(self.compress_columns)
+        converters = self.get_converters()
+        count = 0
+        last_id = 0
+        while True:
+            with self.transaction() as conn:
+                rows = conn.execute(
+                    f'SELECT id, {columns} FROM {self.table_name} WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, batch_size)
+                ).fetchall()
+                updates = []
+                for row_id, *values in rows:
+                    if all(json_codec.is_encoded(v) for v in values):
+                        continue
+                    encoded = [
+                        v if json_codec.is_encoded(v) else json_codec.encode(converters[col](v) if converters.get(col) else v)
+                        for col, v in zip(self.compress_columns, values)
+                    ]
+                    updates.append(encoded + [row_id])
+                if updates:
+                    assignments = ', '.join(f'{col} = ?' for col in self.compress_columns)
+                    conn.executemany(f'UPDATE {self.table_name} SET {assignments} WHERE id = ?', updates)
+            count += len(updates)
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1][0]
+        log.info(f'儲存表 "{self.table_name}" 壓縮資料 {count} 筆')
+        return count
+
+    def vacuum(self):
+        """釋放資料庫中未使用的空間"""
+        with self.lock:
+            self.conn.execute("VACUUM")
+            # WAL 模式下 VACUUM 寫入 WAL 檔，需 checkpoint 後主檔案才會縮小
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
 
-            return results
     def insert_post_data(self, select_column:str, select_value, insert_column:str, insert_data):
         """
         更新指定貼文的資料
         """
         log.info(f'儲存貼文資料： "{select_column}" "{select_value}" "{insert_column}" "{insert_data}"')
-        with sqlite3.connect(self.path) as conn:
-            conn.cursor().execute(f'UPDATE {self.table_name} SET {insert_column} = ? WHERE {select_column} = ?',(serialize_value(insert_data),select_value,))
\ No newline at end of file
+        with self.transaction() as conn:
+            conn.cursor().execute(f'UPDATE {self.table_name} SET {insert_column} = ? WHERE {select_column} = ?',(serialize_value(insert_data),select_value,))
+
+    def update_status_many(self, select_column: str, select_values: Iterable, insert_column: str, insert_data):
+        """以單一交易批次更新多筆貼文的同一欄位"""
+        rows = [(serialize_value(insert_data), value) for value in select_values]
+        if not rows:
+            return
+        log.info(f'批次儲存貼文資料： "{select_column}" {len(rows)} 筆 "{insert_column}" "{insert_data}"')
+        with self.transaction() as conn:
+            conn.executemany(f'UPDATE {self.table_name} SET {insert_column} = ? WHERE {select_column} = ?', rows)
+
+    def get_item(self, keyword, data_value):
+        """取得第一筆符合條件的資料，無資料時回傳None"""
+        items = self.get_specific_list(keyword, data_value)
+        return items[0] if items else None
+
+    def upsert_item(self, item, conflict_key: str):
+        """新增資料，conflict_key 重複時改為更新該筆資料
+        conflict_key 欄位需設定為 UNIQUE
+        """
+        data = asdict(item)
+        if self.skip_auto_key in data.keys():
+            del data[self.skip_auto_key]
+        columns = ', '.join(data.keys())
+        placeholders = ', '.join(['?'] * len(data))
+        updates = ', '.join(f'{col} = excluded.{col}' for col in data.keys() if col != conflict_key)
+        values = [serialize_value(v) for v in data.values()]
+        sql = f'INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders}) ON CONFLICT({conflict_key}) DO UPDATE SET {updates}'
+        with self.transaction() as conn:
+            conn.execute(sql, values)
+
+    def delete_items(self, keyword, data_value):
+        """刪除符合條件的資料"""
+        with self.transaction() as conn:
+            conn.execute(f'DELETE FROM {self.table_name} WHERE {keyword} = ?', (serialize_value(data_value),))
+
+class job_queue(database):
+    """各貼文各階段的待處理工作
+    claim 取得工作時寫入處理權與到期時間，多個程序可同時消化同一佇列而不重複處理
+    失敗時依失敗次數延後下次執行時間，超過最大次數的工作不再取得
+    """
+    # 新增工作時寫入各欄位初始值，欄位沒有預設值，未寫入時為NULL
+    INSERT_COLUMNS = "(pid, stage, attempts, next_attempt_at, lease_owner, lease_expiry, last_error)"
+    INSERT_DEFAULTS = "0, 0, '', 0, ''"
+
+    def __init__(self, path: str, table_name: str, max_attempts: int = 8, retry_delay: float = 60, max_retry_delay: float = 86400):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        super().__init__(path, table_name, Data_Job)
+
+    def create_indexes(self):
+        with self.transaction() as conn:
+            conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{self.table_name}_pid_stage ON {self.table_name} (pid, stage)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_stage_next ON {self.table_name} (stage, next_attempt_at)")
+
+    @contextmanager
+    def immediate_transaction(self):
+        """取得寫入鎖後才讀取，避免多個程序同時取得相同工作"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+
+    def enqueue(self, stage: str, pids: Iterable[str]):
+        """新增工作，已存在的工作略過"""
+        rows = [(pid, stage) for pid in pids]
+        with self.transaction() as conn:
+            conn.executemany(f'INSERT OR IGNORE INTO {self.table_name} {self.INSERT_COLUMNS} VALUES (?, ?, {self.INSERT_DEFAULTS})', rows)
+
+    def enqueue_pending(self, stage: str, posts: database, condition: str, params: list) -> int:
+        """將貼文表中符合條件(尚未完成該階段)的貼文加入工作，回傳新增數量"""
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.execute(
+                f'INSERT OR IGNORE INTO {self.table_name} {self.INSERT_COLUMNS} SELECT pid, ?, {self.INSERT_DEFAULTS} FROM {posts.table_name} WHERE {condition}',
+                [stage] + params
+            )
+            return conn.total_changes - before
+
+    def get_claimable_condition(self, now: float) -> tuple[str, list]:
+        return 'next_attempt_at <= ? AND lease_expiry <= ? AND attempts < ?', [now, now, self.max_attempts]
+
+    def claim(self, stage: str, owner: str, limit: int = 100, lease_seconds: float = 600) -> list[Data_Job]:
+        """取得可執行的工作並寫入處理權"""
+        now = time.time()
+        condition, params = self.get_claimable_condition(now)
+        with self.immediate_transaction() as conn:
+            cursor = conn.execute(
+                f'SELECT * FROM {self.table_name} WHERE stage = ? AND {condition} ORDER BY id LIMIT ?',
+                [stage] + params + [limit]
+            )
+            jobs = self.convert_rows(cursor)
+            conn.executemany(
+                f'UPDATE {self.table_name} SET lease_owner = ?, lease_expiry = ? WHERE id = ?',
+                [(owner, now + lease_seconds, job.id) for job in jobs]
+            )
+        for job in jobs:
+            job.lease_owner = owner
+            job.lease_expiry = now + lease_seconds
+        return jobs
+
+    def claim_pid(self, stage: str, pid: str, owner: str, lease_seconds: float = 600) -> Data_Job | None:
+        """取得指定貼文的工作，工作不存在時新增，尚未到執行時間或由其他程序處理中時回傳None"""
+        now = time.time()
+        condition, params = self.get_claimable_condition(now)
+        with self.immediate_transaction() as conn:
+            conn.execute(f'INSERT OR IGNORE INTO {self.table_name} {self.INSERT_COLUMNS} VALUES (?, ?, {self.INSERT_DEFAULTS})', (pid, stage))
+            cursor = conn.execute(
+                f'SELECT * FROM {self.table_name} WHERE pid = ? AND stage = ? AND {condition}',
+                [pid, stage] + params
+            )
+            jobs = self.convert_rows(cursor)
+            if not jobs:
+                return None
+            job = jobs[0]
+            conn.execute(
+                f'UPDATE {self.table_name} SET lease_owner = ?, lease_expiry = ? WHERE id = ?',
+                (owner, now + lease_seconds, job.id)
+            )
+        job.lease_owner = owner
+        job.lease_expiry = now + lease_seconds
+        return job
+
+    def renew(self, job: Data_Job, lease_seconds: float = 600) -> bool:
+        """延長處理權，批次取得的工作在實際處理前續約，回傳是否仍持有處理權
+        處理權已到期且被其他程序取得(或已完成)時回傳False，不應再處理
+        """
+        expiry = time.time() + lease_seconds
+        with self.transaction() as conn:
+            renewed = conn.execute(
+                f'UPDATE {self.table_name} SET lease_expiry = ? WHERE id = ? AND lease_owner = ?',
+                (expiry, job.id, job.lease_owner)
+            ).rowcount == 1
+        if renewed:
+            job.lease_expiry = expiry
+        return renewed
+
+    def complete(self, job: Data_Job):
+        """完成工作，完成狀態記錄於貼文表，工作直接刪除"""
+        with self.transaction() as conn:
+            conn.execute(f'DELETE FROM {self.table_name} WHERE id = ? AND lease_owner = ?', (job.id, job.lease_owner))
+
+    def fail(self, job: Data_Job, error: str):
+        """紀錄失敗並釋放處理權，下次執行時間依失敗次數倍增"""
+        attempts = job.attempts + 1
+        delay = min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay)
+        with self.transaction() as conn:
+            conn.execute(
+                f"UPDATE {self.table_name} SET attempts = ?, next_attempt_at = ?, lease_owner = '', lease_expiry = 0, last_error = ? "
+                f"WHERE id = ? AND lease_owner = ?",
+                (attempts, time.time() + delay, error, job.id, job.lease_owner)
+            )
+        if attempts >= self.max_attempts:
+            log.warning(f'貼文 {job.pid} 的 {job.stage} 階段已失敗 {attempts} 次，停止重試：{error}')
+        else:
+            log.info(f'貼文 {job.pid} 的 {job.stage} 階段第 {attempts} 次失敗，{delay:.0f} 秒後重試')
+
+
+class lease_table(database):
+    """多個程序共用的租約，持有者需在到期前續約，到期後其他程序可取得"""
+    def __init__(self, path: str, table_name: str = 'leases'):
+        super().__init__(path, table_name, Data_Lease)
+
+    def acquire(self, name: str, owner: str, seconds: float) -> bool:
+        """取得或續約租約，租約由其他程序持有且未到期時回傳False"""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(f"INSERT OR IGNORE INTO {self.table_name} (name, owner, expiry) VALUES (?, '', 0)", (name,))
+            cursor = conn.execute(
+                f'UPDATE {self.table_name} SET owner = ?, expiry = ? WHERE name = ? AND (owner = ? OR expiry <= ?)',
+                (owner, now + seconds, name, owner, now)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, name: str, owner: str):
+        with self.transaction() as conn:
+            conn.execute(f"UPDATE {self.table_name} SET owner = '', expiry = 0 WHERE name = ? AND owner = ?", (name, owner))
+
+    def is_alive(self, name: str) -> bool:
+        """租約是否由任一程序持有中"""
+        with self.transaction() as conn:
+            row = conn.execute(f'SELECT expiry FROM {self.table_name} WHERE name = ?', (name,)).fetchone()
+        return bool(row) and row[0] > time.time()
+
+class download_manifest(database):
+    """已下載網址的紀錄，下載前先查詢，已下載且檔案仍存在時不需發出請求"""
+    def __init__(self, path: str, table_name: str = 'downloads', store: "media_store | None" = None):
+        super().__init__(path, table_name, Data_Download)
+        # 設定內容庫時，下載完成的檔案依內容雜湊存入內容庫
+        self.store = store
+
+    def lookup(self, url: str) -> Data_Download | None:
+        """取得網址的下載紀錄，檔案已不存在或大小不符時刪除紀錄"""
+        key = canonical_url(url)
+        item = self.get_item('url', key)
+        if not item:
+            return None
+        if not os.path.exists(item.path) or get_size(item.path) != item.size:
+            log.info(f'下載紀錄的檔案已變更，移除紀錄：{item.path}')
+            self.delete_items('url', key)
+            return None
+        return item
+
+    def record(self, url: str, path: str, etag: str = '', last_modified: str = '', sha256: str = ''):
+        self.upsert_item(Data_Download(
+            url=canonical_url(url),
+            path=os.path.abspath(path),
+            size=get_size(path),
+            etag=etag,
+            last_modified=last_modified,
+            sha256=sha256,
+            updated=time.time(),
+        ), 'url')
+
+class media_store(database):
+    """內容定址儲存，檔案依 sha256 存為 `<root>/<前兩碼>/<雜湊>`，各貼文目錄以硬連結指向同一份內容
+    內容庫需與下載目錄位於同一磁碟，無法建立硬連結時檔案維持原樣不存入
+    """
+    def __init__(self, path: str, root: str, table_name: str = 'blobs'):
+        super().__init__(path, table_name, Data_Blob)
+        self.root = root
+
+    def get_blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def add(self, path: str, sha256: str) -> bool:
+        """將檔案存入內容庫，回傳內容是否已存在
+        內容已存在時以硬連結取代檔案，重複的內容只佔用一份空間
+        """
+        if not sha256 or not os.path.isfile(path):
+            return False
+        blob = self.get_blob_path(sha256)
+        try:
+            if os.path.isfile(blob):
+                existed = True
+                if not os.path.samefile(path, blob):
+                    temp = f'{path}.blob'
+                    os.link(blob, temp)
+                    os.replace(temp, path)
+                    log.info(f'重複內容，改為連結內容庫檔案：{path} -> {blob}')
+            else:
+                existed = False
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.link(path, blob)
+        except OSError as e:
+            log.warning(f'無法存入內容庫：{path}，{e}')
+            return False
+        if not self.has_value('sha256', sha256):
+            self.upsert_item(Data_Blob(sha256=sha256, size=get_size(blob), created=time.time()), 'sha256')
+        return existed
+
+    def get(self, sha256: str) -> Data_Blob | None:
+        """取得內容紀錄，內容庫中的檔案已不存在時刪除紀錄"""
+        if not sha256:
+            return None
+        item = self.get_item('sha256', sha256)
+        if item and not os.path.isfile(self.get_blob_path(sha256)):
+            self.delete_items('sha256', sha256)
+            return None
+        return item
+
+    def mark(self, sha256: str, column: str, value=True):
+        """標記內容已完成的處理(extracted、uploaded)，之後重複的內容不再處理"""
+        if sha256:
+            self.insert_post_data('sha256', sha256, column, value)
+
+class key_lookup:
+    """以索引逐筆查詢欄位值是否已存在，供 `in` 判斷使用，不需將整欄讀入記憶體"""
+    def __init__(self, db: database, key: str) -> None:
+        self.db = db
+        self.key = key
+
+    def __contains__(self, value) -> bool:
+        return self.db.has_value(self.key, value)
+
+    def intersection(self, values: Iterable) -> set:
+        """以單次查詢取得已存在的值，與 set.intersection 用法相同"""
+        return self.db.get_existing_values(self.key, values)
+
+class lazy_row:
+    """延遲轉換的資料列，以屬性存取欄位，JSON 欄位在第一次存取時才解碼並保留結果"""
+    __slots__ = ('_raw', '_converters', '_values')
+
+    def __init__(self, raw: dict, converters: dict[str, Callable]) -> None:
+        self._raw = raw
+        self._converters = converters
+        self._values = {}
+
+    def __getattr__(self, name):
+        if name in self._values:
+            return self._values[name]
+        if name not in self._raw:
+            raise AttributeError(f"未讀取欄位：{name}")
+        converter = self._converters.get(name)
+        value = converter(self._raw[name]) if converter else self._raw[name]
+        self._values[name] = value
+        return value
+
+    def keys(self) -> list[str]:
+        return list(self._raw.keys())
@@ -1,20 +1,35 @@
 import os
 import time
+import re
 import json
+import random
+import shutil
+import base64
+import hashlib
+import html
 import aiohttp
+import atexit
 import asyncio
 import aiofiles
 import logging
+import threading
 import requests
 import subprocess
 
 from urllib.parse import unquote
+from concurrent.futures import Future, ThreadPoolExecutor
 from src.utils import path_format
 from src.app_types import post_parse
 from src.service import compress
+from src.utils.rate_limit import limiter
+from src.utils.tools import hash_file
 
 log = logging.getLogger(__name__)
 
+# MediaFire 檔案頁面的下載按鈕，新版頁面以 base64 保存網址
+MEDIAFIRE_SCRAMBLED_REGEX = re.compile(r'data-scrambled-url="([^"]+)"')
+MEDIAFIRE_DIRECT_REGEX = re.compile(r'href="(https?://download[^"]+)"')
+
 def download_json(filepath, content):
     if os.path.exists(filepath):
         log.info(f'檔案已存在：{filepath}')
@@ -24,27 +39,253 @@ def download_json(filepath, content):
     with open(filepath, 'w', encoding='utf-8') as f:
         f.write(json.dumps(content, indent=4, ensure_ascii=False))
 
-def download_file_by_url(url: str, filepath: str, cookies: dict | None = None, headers: dict | None=None, stream=True, retry_times=6, chunk_size=262144, timeout=30, size_check = True):
+PART_SUFFIX = '.part' # 下載中的暫存檔
+VALIDATOR_SUFFIX = '.part.json' # 暫存檔對應的伺服器檔案版本(ETag/Last-Modified)與大小
+SEGMENT_MIN_SIZE = 64 * 1024 * 1024 # 檔案大於此大小才分段下載
+
+def retry_delay(attempt: int, base: float = 1, max_delay: float = 60) -> float:
+    """重試等待時間，依嘗試次數倍增並加入隨機延遲，避免同時重試"""
+    return min(base * 2 ** (attempt - 1), max_delay) + random.uniform(0, base)
+
+def get_part_path(filepath: str) -> str:
+    """暫存檔路徑，副檔名由回應決定時({ext})暫存檔不含副檔名"""
+    return filepath.replace('.{ext}', '').replace('{ext}', '') + PART_SUFFIX
+
+def parse_content_range(value: str) -> tuple[int, int] | None:
+    """解析 Content-Range(bytes 起點-終點/總大小)，回傳(起點, 總大小)"""
+    match = re.match(r'bytes (\d+)-\d+/(\d+)', value or '')
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+def load_part(part_path: str) -> tuple[int, dict]:
+    """讀取暫存檔已下載大小與版本資訊，無法確認版本的暫存檔刪除後重新下載"""
+    if not os.path.exists(part_path):
+        return 0, {}
+    validator = {}
+    try:
+        with open(part_path[:-len(PART_SUFFIX)] + VALIDATOR_SUFFIX, 'r', encoding='utf-8') as f:
+            validator = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        pass
+    if not validator.get('etag') and not validator.get('last_modified'):
+        remove_part(part_path)
+        return 0, {}
+    return os.path.getsize(part_path), validator
+
+def save_validator(part_path: str, response_headers, total: int, ext: str = ''):
+    validator = {
+        'etag': response_headers.get('ETag', ''),
+        'last_modified': response_headers.get('Last-Modified', ''),
+        'size': total,
+        'ext': ext,
+    }
+    with open(part_path[:-len(PART_SUFFIX)] + VALIDATOR_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump(validator, f)
+
+def remove_part(part_path: str):
+    for path in (part_path, part_path[:-len(PART_SUFFIX)] + VALIDATOR_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
+
+def get_range_headers(headers: dict | None, offset: int, validator: dict) -> dict:
+    """續傳請求標頭，If-Range 確保伺服器檔案未變更，變更時伺服器回傳完整檔案"""
+    headers = dict(headers or {})
+    if offset:
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = validator.get('etag') or validator.get('last_modified')
+    return headers
+
+def get_resume_state(status: int, response_headers, offset: int) -> tuple[int, int] | None:
+    """依回應判斷寫入起點與檔案總大小，回傳(寫入起點, 總大小)，無法使用的回應回傳None
+    206 且起點相符時接續暫存檔，200 代表伺服器不支援續傳或檔案已變更，從頭下載
+    """
+    if status == 206:
+        content_range = parse_content_range(response_headers.get('Content-Range', ''))
+        if content_range and content_range[0] == offset:
+            return offset, content_range[1]
+        return None
+    if status == 200:
+        return 0, int(response_headers.get('Content-Length', 0))
+    return None
+
+def finish_part(part_path: str, filepath: str):
+    os.replace(part_path, filepath)
+    remove_part(part_path)
+
+def link_file(source: str, target: str):
+    """建立硬連結，不支援時(跨磁碟等)改為複製"""
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        if os.path.isdir(source):
+            shutil.copytree(source, target)
+        else:
+            shutil.copy2(source, target)
+
+def reuse_download(manifest, url: str, filepath: str) -> str | None:
+    """查詢下載紀錄，已下載過時將既有檔案連結到目標路徑並回傳路徑，不發出任何請求"""
+    if manifest is None:
+        return None
+    item = manifest.lookup(url)
+    if not item:
+        return None
+    target = filepath
+    if '{ext}' in filepath:
+        target = filepath.format(ext=os.path.splitext(item.path)[1].lstrip('.') or 'bin')
+    if os.path.abspath(target) != item.path and not os.path.exists(target):
+        link_file(item.path, target)
+    log.info(f"已下載過，略過請求: {url} -> {target}")
+    return target
+
+def record_download(manifest, url: str, path: str, etag: str = '', last_modified: str = '', sha256: str = '') -> str:
+    """紀錄下載完成的網址並回傳內容雜湊，未輸入雜湊時讀取檔案計算
+    下載紀錄設定內容庫時將檔案存入內容庫，重複的內容改為連結既有檔案
+    """
+    if manifest is None:
+        return sha256
+    if not sha256 and os.path.isfile(path):
+        sha256 = hash_file(path)
+    if manifest.store is not None:
+        manifest.store.add(path, sha256)
+    manifest.record(url, path, etag, last_modified, sha256)
+    return sha256
+
+def create_download_session(cookies: dict | None = None) -> requests.Session:
+    session = requests.Session()
+    if cookies:
+        session.cookies.update(cookies)
+    return session
+
+def probe_range(url: str, cookies: dict | None, headers: dict | None, timeout: int) -> tuple[int, dict] | None:
+    """以單一位元組的範圍請求確認伺服器支援分段下載，回傳(檔案大小, 版本資訊)"""
+    session = create_download_session(cookies)
+    limiter.wait(url)
+    with session.get(url, headers={**(headers or {}), 'Range': 'bytes=0-0'}, stream=True, timeout=timeout) as response:
+        content_range = parse_content_range(response.headers.get('Content-Range', ''))
+        if response.status_code != 206 or not content_range:
+            return None
+        return content_range[1], {
+            'etag': response.headers.get('ETag', ''),
+            'last_modified': response.headers.get('Last-Modified', ''),
+        }
+
+def download_segment(url: str, part_path: str, start: int, end: int, validator: dict, cookies: dict | None, headers: dict | None, retry_times: int, chunk_size: int, timeout: int) -> int:
+    """下載 start 到 end(包含)的位元組並寫入暫存檔對應位置，中斷時從已寫入位置續傳，回傳寫入的位元組數"""
+    session = create_download_session(cookies)
+    offset = start
+    for attempt in range(1, retry_times + 1):
+        try:
+            limiter.wait(url)
+            range_headers = {**(headers or {}), 'Range': f'bytes={offset}-{end}'}
+            if validator.get('etag') or validator.get('last_modified'):
+                range_headers['If-Range'] = validator.get('etag') or validator.get('last_modified')
+            with session.get(url, headers=range_headers, stream=True, timeout=timeout) as response:
+                content_range = parse_content_range(response.headers.get('Content-Range', ''))
+                if response.status_code != 206 or not content_range or content_range[0] != offset:
+                    # 伺服器檔案已變更或不再支援範圍請求
+                    log.warning(f"分段下載回應異常: {response.status_code}，範圍: {offset}-{end}，URL: {url}")
+                    return offset - start
+                with open(part_path, 'r+b') as f:
+                    f.seek(offset)
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            chunk = chunk[:end + 1 - offset]
+                            f.write(chunk)
+                            offset += len(chunk)
+                            if offset > end:
+                                break
+            if offset > end:
+                return offset - start
+        except Exception as e:
+            log.warning(f"分段下載時發生錯誤: {e}，範圍: {offset}-{end}，嘗試次數: {attempt}")
+        time.sleep(retry_delay(attempt))
+    return offset - start
+
+def download_segmented(url: str, filepath: str, segments: int, min_size: int, cookies: dict | None = None, headers: dict | None = None, retry_times=6, chunk_size=262144, timeout=30, manifest=None) -> bool | None:
+    """將大型檔案分成多個範圍同時下載到預先配置大小的暫存檔
+    伺服器不支援範圍請求或檔案小於 min_size 時回傳None，由單一連線下載
+    """
+    probe = probe_range(url, cookies, headers, timeout)
+    if not probe:
+        return None
+    total, validator = probe
+    if total < min_size:
+        return None
+    part_path = get_part_path(filepath)
+    with open(part_path, 'wb') as f:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(f.fileno(), 0, total)
+        else:
+            f.truncate(total)
+    segment_size = -(-total // segments)
+    ranges = [(start, min(start + segment_size, total) - 1) for start in range(0, total, segment_size)]
+    log.info(f"分段下載: {filepath}，大小: {total / 1024 / 1024:.2f} MB，分段數: {len(ranges)}")
+    with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="segment") as executor:
+        written = list(executor.map(
+            lambda r: download_segment(url, part_path, r[0], r[1], validator, cookies, headers, retry_times, chunk_size, timeout),
+            ranges
+        ))
+    # 暫存檔已預先配置大小，需以各分段寫入量確認下載完整
+    if sum(written) != total or os.path.getsize(part_path) != total:
+        log.warning(f"分段下載不完整: {filepath}，伺服器大小: {total}，已下載: {sum(written)}")
+        remove_part(part_path)
+        return False
+    finish_part(part_path, filepath)
+    # 分段不依序到達，完成後再計算雜湊
+    record_download(manifest, url, filepath, validator['etag'], validator['last_modified'])
+    log.info(f"下載成功: {filepath}，大小: {total / 1024 / 1024:.2f} MB")
+    return True
+
+def download_file_by_url(url: str, filepath: str, cookies: dict | None = None, headers: dict | None=None, stream=True, retry_times=6, chunk_size=262144, timeout=30, size_check = True, segments=1, segment_min_size=SEGMENT_MIN_SIZE, manifest=None):
+    """下載檔案，segments 大於1時大型檔案改以多個連線分段下載，分段下載失敗時改用單一連線續傳下載
+    有下載紀錄(manifest)時先查詢紀錄，已下載過的網址不發出請求
+    """
     if not filepath:
         log.error("檔案路徑無效！")
         return False
     
     os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    if reuse_download(manifest, url, filepath):
+        return True
+    part_path = get_part_path(filepath)
+    if segments > 1 and not os.path.exists(filepath) and not os.path.exists(part_path):
+        try:
+            if download_segmented(url, filepath, segments, segment_min_size, cookies, headers, retry_times, chunk_size, timeout, manifest):
+                return True
+        except Exception as e:
+            log.warning(f"分段下載失敗: {e}，改用單一連線下載")
+            remove_part(part_path)
     session = requests.Session()
     for attempt in range(1, retry_times + 1):
         if cookies:
             session.cookies.update(cookies)
         try:
-            response = session.get(url, headers=headers, stream=stream, timeout=timeout)
-            if response.status_code != 200:
+            offset, validator = load_part(part_path)
+            limiter.wait(url)
+            response = session.get(url, headers=get_range_headers(headers, offset, validator), stream=stream, timeout=timeout)
+            if response.status_code == 416 and offset and offset == validator.get('size'):
+                # 暫存檔已下載完整
+                response.close()
+                finish_part(part_path, filepath)
+                record_download(manifest, url, filepath, validator.get('etag', ''), validator.get('last_modified', ''))
+                log.info(f"下載成功: {filepath}，大小: {offset / 1024 / 1024:.2f} MB")
+                return True
+            state = get_resume_state(response.status_code, response.headers, offset)
+            if state is None:
                 log.warning(f"HTTP 狀態碼錯誤: {response.status_code}，URL: {url}，嘗試次數: {attempt}")
-                time.sleep(3)
+                response.close()
+                if response.status_code in (206, 416):
+                    # 續傳範圍不符，刪除暫存檔重新下載
+                    remove_part(part_path)
+                time.sleep(retry_delay(attempt))
                 continue
-
-            file_size = int(response.headers.get('Content-Length', 0))
+            start, file_size = state
             if file_size == 0:
                 log.warning(f"伺服器返回空檔案，URL: {url}，嘗試次數: {attempt}")
-                time.sleep(3)
+                response.close()
+                time.sleep(retry_delay(attempt))
                 continue
 
             if os.path.exists(filepath):
@@ -58,122 +299,246 @@ def download_file_by_url(url: str, filepath: str, cookies: dict | None = None, h
                     else:
                         log.info(f"檔案已存在: {filepath}，大小: {local_size / 1024 / 1024:.2f} MB")
                         response.close()
+                        record_download(manifest, url, filepath, response.headers.get('ETag', ''), response.headers.get('Last-Modified', ''))
                         return True
                 else:
                     log.info(f"檔案已存在: {filepath}，跳過檔案大小檢查")
                     response.close()
                     return True
 
-            with open(filepath, 'wb') as f:
+            if start:
+                log.info(f"續傳下載: {filepath}，已下載: {start / 1024 / 1024:.2f} MB")
+            else:
+                save_validator(part_path, response.headers, file_size)
+            # 下載時同步計算雜湊，續傳時先讀入已下載的部分
+            hasher = hashlib.sha256()
+            if start:
+                hash_file(part_path, hasher)
+            with open(part_path, 'ab' if start else 'wb') as f:
                 for chunk in response.iter_content(chunk_size=chunk_size):
                     if chunk:  # 避免空內容
                         f.write(chunk)
+                        hasher.update(chunk)
             
-            local_size = os.path.getsize(filepath)
+            local_size = os.path.getsize(part_path)
             if size_check:
                 # 確認檔案大小一致
                 if local_size != file_size:
                     log.warning(f"檔案異常！檔案路徑: {filepath}")
                     log.warning(f"檔案大小不匹配！伺服器大小: {file_size}，本地大小: {local_size}，嘗試次數: {attempt}")
-                    os.remove(filepath)
-                    time.sleep(3)
+                    if local_size > file_size:
+                        remove_part(part_path)
+                    time.sleep(retry_delay(attempt))
                     continue
 
+            finish_part(part_path, filepath)
+            record_download(manifest, url, filepath, response.headers.get('ETag', ''), response.headers.get('Last-Modified', ''), hasher.hexdigest())
             log.info(f"下載成功: {filepath}，大小: {local_size / 1024 / 1024:.2f} MB")
             return True
 
         except Exception as e:
+            # 保留暫存檔，下次嘗試時續傳
             log.warning(f"下載時發生其他錯誤: {e}，嘗試次數: {attempt}")
-            time.sleep(3)
+            time.sleep(retry_delay(attempt))
 
     log.error(f"下載失敗，URL: {url}")
     return False
 
-async def async_download(url: str, filepath: str, session: aiohttp.ClientSession, retry_times=3, chunk_size=262144, timeout=10, size_check = True):
+async def run_blocking(func, *args):
+    """在執行緒池執行會阻塞事件迴圈的工作(下載紀錄的資料庫讀寫、讀取檔案計算雜湊)，避免暫停其他附件下載"""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+async def async_download(url: str, filepath: str, session: aiohttp.ClientSession, retry_times=3, chunk_size=262144, timeout=10, size_check = True, manifest=None):
     timeout_context = aiohttp.ClientTimeout(total=timeout)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    if await run_blocking(reuse_download, manifest, url, filepath):
+        return True
+    part_path = get_part_path(filepath)
     for attempt in range(1, retry_times + 1):
         try:
-            async with session.get(url, timeout=timeout_context) as response:
-                if response.status != 200:
+            offset, validator = load_part(part_path)
+            await limiter.async_wait(url)
+            async with session.get(url, headers=get_range_headers(None, offset, validator), timeout=timeout_context) as response:
+                file_ext = response.headers.get('Content-Type', 'application/octet-stream').split(';', 1)[0].split('/', 1)[1].replace("jpeg", "jpg")
+                target = filepath.format(ext=file_ext) if '{ext}' in filepath else filepath
+                if response.status == 416 and offset and offset == validator.get('size'):
+                    # 暫存檔已下載完整，副檔名改由暫存時紀錄的內容類型決定
+                    target = filepath.format(ext=validator.get('ext', 'bin')) if '{ext}' in filepath else filepath
+                    finish_part(part_path, target)
+                    await run_blocking(record_download, manifest, url, target, validator.get('etag', ''), validator.get('last_modified', ''))
+                    log.info(f"下載成功: {target}，大小: {offset / 1024 / 1024:.2f} MB")
+                    return True
+                state = get_resume_state(response.status, response.headers, offset)
+                if state is None:
                     log.warning(f"HTTP 狀態碼錯誤: {response.status}，URL: {url}，嘗試次數: {attempt}")
-                    await asyncio.sleep(3)
+                    if response.status in (206, 416):
+                        # 續傳範圍不符，刪除暫存檔重新下載
+                        remove_part(part_path)
+                    await asyncio.sleep(retry_delay(attempt))
                     continue
-
-                file_size = int(response.headers.get('Content-Length', 0))
-                file_ext = response.headers.get('Content-Type', 'application/octet-stream').split(';', 1)[0].split('/', 1)[1].replace("jpeg", "jpg")
-                if '{ext}' in filepath:
-                    filepath = filepath.format(ext=file_ext)
+                start, file_size = state
                 if file_size == 0:
                     log.warning(f"伺服器返回空檔案，URL: {url}，嘗試次數: {attempt}")
-                    await asyncio.sleep(3)
+                    await asyncio.sleep(retry_delay(attempt))
                     continue
 
-                if os.path.exists(filepath):
-                    local_size = os.path.getsize(filepath)
+                if os.path.exists(target):
+                    local_size = os.path.getsize(target)
                     if size_check:
                         # 確認檔案大小一致
                         if local_size != file_size:
-                            log.warning(f"檔案異常！移除檔案: {filepath}")
+                            log.warning(f"檔案異常！移除檔案: {target}")
                             log.warning(f"檔案大小不匹配！伺服器大小: {file_size}，本地大小: {local_size}，嘗試次數: {attempt}")
-                            os.remove(filepath)
+                            os.remove(target)
                         else:
-                            log.info(f"檔案已存在: {filepath}，符合大小: {local_size / 1024 / 1024:.2f} MB")
-                            response.close()
+                            log.info(f"檔案已存在: {target}，符合大小: {local_size / 1024 / 1024:.2f} MB")
+                            await run_blocking(record_download, manifest, url, target, response.headers.get('ETag', ''), response.headers.get('Last-Modified', ''))
                             return True
                     else:
-                        log.info(f"檔案已存在: {filepath}，跳過檔案大小檢查")
-                        response.close()
+                        log.info(f"檔案已存在: {target}，跳過檔案大小檢查")
                         return True
 
-                async with aiofiles.open(filepath, 'wb') as f:
+                if not start:
+                    save_validator(part_path, response.headers, file_size, file_ext)
+                # 下載時同步計算雜湊，續傳時先讀入已下載的部分
+                hasher = hashlib.sha256()
+                if start:
+                    await run_blocking(hash_file, part_path, hasher)
+                async with aiofiles.open(part_path, 'ab' if start else 'wb') as f:
                     async for chunk in response.content.iter_chunked(chunk_size):
                         if chunk:  # 避免空內容
                             await f.write(chunk)
+                            hasher.update(chunk)
+                etag, last_modified = response.headers.get('ETag', ''), response.headers.get('Last-Modified', '')
                 
-                local_size = os.path.getsize(filepath)
+                local_size = os.path.getsize(part_path)
                 if size_check:
                     # 確認檔案大小一致
                     if local_size != file_size:
-                        log.warning(f"檔案異常！移除檔案: {filepath}")
+                        log.warning(f"檔案異常！檔案路徑: {target}")
                         log.warning(f"檔案大小不匹配！伺服器大小: {file_size}，本地大小: {local_size}，嘗試次數: {attempt}")
-                        await asyncio.sleep(3)
-                        os.remove(filepath)
+                        if local_size > file_size:
+                            remove_part(part_path)
+                        await asyncio.sleep(retry_delay(attempt))
                         continue
 
-            log.info(f"下載成功: {filepath}，大小: {local_size / 1024 / 1024:.2f} MB")
+            finish_part(part_path, target)
+            await run_blocking(record_download, manifest, url, target, etag, last_modified, hasher.hexdigest())
+            log.info(f"下載成功: {target}，大小: {local_size / 1024 / 1024:.2f} MB")
             return True
         except asyncio.TimeoutError:
             log.warning(f"下載超時，URL: {url}，嘗試次數: {attempt}")
         except Exception as e:
             log.warning(f"下載時發生其他錯誤: {e}，嘗試次數: {attempt}")
-        await asyncio.sleep(1)
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        await asyncio.sleep(3)
+        # 保留暫存檔，下次嘗試時續傳
+        await asyncio.sleep(retry_delay(attempt))
 
     log.error(f"下載失敗，URL: {url}")
     return False
 
-async def save_attachments(folder: str, pid: str, links: list[str]):
-    session = aiohttp.ClientSession()
+async def _bounded_download(semaphore: asyncio.Semaphore | None, url: str, filepath: str, session: aiohttp.ClientSession, manifest=None):
+    if semaphore is None:
+        return await async_download(url, filepath, session, manifest=manifest)
+    async with semaphore:
+        return await async_download(url, filepath, session, manifest=manifest)
+
+async def save_attachments(folder: str, pid: str, links: list[str], session: aiohttp.ClientSession | None = None, semaphore: asyncio.Semaphore | None = None, manifest=None):
+    """下載貼文附件，未輸入session時建立新的session並於完成後關閉"""
+    own_session = session is None
+    if own_session:
+        session = aiohttp.ClientSession()
     tasks = []
     for link in links:
         if '=s0?imgmax=0' not in link:
             continue
         filepath = os.path.join(folder, f"{pid}_{len(tasks)}." + '{ext}')
         log.info(f"下載附件：{link}")
-        task = async_download(link, filepath, session)
+        task = _bounded_download(semaphore, link, filepath, session, manifest)
         tasks.append(task)
     await asyncio.gather(*tasks)
-    await session.close()
+    if own_session:
+        await session.close()
 
+class AttachmentDownloader:
+    """在背景執行緒的常駐事件迴圈下載附件
+    所有貼文共用同一個 aiohttp session(連線池)，並以同一個上限控制同時下載數量
+    """
+    def __init__(self, concurrency: int = 8) -> None:
+        self.concurrency = max(concurrency, 1)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="attachments", daemon=True)
+        self.thread.start()
+        self.session: aiohttp.ClientSession | None = None
+        self.semaphore: asyncio.Semaphore | None = None
 
+    async def _save(self, folder: str, pid: str, links: list[str], manifest=None):
+        if self.session is None:
+            # session 與 semaphore 需在事件迴圈內建立
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.concurrency))
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        await save_attachments(folder, pid, links, self.session, self.semaphore, manifest)
 
-def mediafire_downloader(url: str, folder: str):
+    def submit(self, folder: str, pid: str, links: list[str], manifest=None) -> Future:
+        """排入下載，立即回傳 Future"""
+        return asyncio.run_coroutine_threadsafe(self._save(folder, pid, links, manifest), self.loop)
+
+    def close(self):
+        if self.session is not None:
+            asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+            self.session = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+_attachment_downloader: AttachmentDownloader | None = None
+_attachment_lock = threading.Lock()
+
+def get_attachment_downloader(concurrency: int = 8) -> AttachmentDownloader:
+    """取得程序共用的附件下載器，第一次呼叫時建立"""
+    global _attachment_downloader
+    with _attachment_lock:
+        if _attachment_downloader is None:
+            _attachment_downloader = AttachmentDownloader(concurrency)
+            atexit.register(_attachment_downloader.close)
+        return _attachment_downloader
+
+
+
+def normalize_mediafire_url(url: str) -> str:
     if '/file' == url[-5:]:
         url = url[:-5]
     if '/view/' in url:
         url = url.replace('/view/', '/file/')
+    return url
+
+def resolve_mediafire_link(url: str, timeout: int = 30) -> tuple[str, str] | None:
+    """取得 MediaFire 單一檔案頁面的直接下載網址與檔名，資料夾或無法解析時回傳None"""
+    url = normalize_mediafire_url(url)
+    if '/file/' not in url and '/file_premium/' not in url:
+        return None
+    try:
+        limiter.wait(url)
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+    except Exception as e:
+        log.warning(f"無法讀取 MediaFire 頁面: {e}，URL: {url}")
+        return None
+    direct = ''
+    if match := MEDIAFIRE_SCRAMBLED_REGEX.search(response.text):
+        try:
+            direct = base64.b64decode(match.group(1)).decode('utf-8')
+        except ValueError:
+            direct = ''
+    if not direct and (match := MEDIAFIRE_DIRECT_REGEX.search(response.text)):
+        direct = html.unescape(match.group(1))
+    if not direct.startswith('http'):
+        log.warning(f"無法取得 MediaFire 直接下載網址，URL: {url}")
+        return None
+    filename = unquote(direct.split('?')[0].split('/')[-1])
+    return direct, filename
+
+def mediafire_downloader(url: str, folder: str):
+    url = normalize_mediafire_url(url)
 
     filename = ''
     if '/file/' in url or '/folder/' in url or '/file_premium/' in url:
@@ -190,25 +555,58 @@ def mediafire_downloader(url: str, folder: str):
         log.error(f"錯誤訊息：\n{response.stderr.decode('utf-8')}")
     return filename
 
-def download_links(folder: str, links: list[str]) -> tuple[list[post_parse.FileInfo], list[post_parse.FileInfo], list[post_parse.FileInfo]]:
+def download_mediafire(link: str, folder: str, segments: int = 1) -> str:
+    """下載 MediaFire 連結並回傳檔名
+    segments 大於1時取得單一檔案的直接下載網址，大型檔案以多個連線分段下載，無法取得或下載失敗時改用 mdrs
+    """
+    if segments > 1 and (resolved := resolve_mediafire_link(link)):
+        direct, filename = resolved
+        if download_file_by_url(direct, os.path.join(folder, filename), segments=segments):
+            return filename
+        log.warning(f"直接下載失敗，改用 mdrs 下載：{link}")
+    return mediafire_downloader(link, folder)
+
+def extract_download(filepath: str, sha256: str = '', store=None):
+    """解壓縮下載的檔案到所在目錄，有內容庫時相同內容已解壓縮到同一目錄則略過"""
+    blob = store.get(sha256) if store is not None else None
+    output = os.path.abspath(os.path.dirname(filepath))
+    if blob and blob.extracted == output:
+        log.info(f"相同內容已解壓縮過，略過解壓縮：{filepath}")
+        return
+    try:
+        compress.UncompresserFactory.get_uncompresser(filepath).uncompress(filepath)
+        if blob:
+            store.mark(sha256, 'extracted', output)
+    except Exception as e:
+        pass
+
+def download_links(folder: str, links: list[str], manifest=None, segments: int = 1) -> tuple[list[post_parse.FileInfo], list[post_parse.FileInfo], list[post_parse.FileInfo]]:
     """return success, error, unknown"""
     success, error, unknown = [], [], []
+    store = manifest.store if manifest is not None else None
     for link in links:
         file_info = None
         if 'mediafire' in link:
+            if item := (manifest.lookup(link) if manifest is not None else None):
+                # 已下載過的連結不重新下載，檔案連結到目前的輸出目錄，只有新連結的檔案需要解壓縮
+                filepath = os.path.join(folder, os.path.basename(item.path))
+                log.info(f"已下載過，略過請求: {link} -> {filepath}")
+                if os.path.abspath(filepath) != item.path and not os.path.exists(filepath):
+                    link_file(item.path, filepath)
+                    extract_download(filepath, item.sha256, store)
+                success.append(post_parse.FileInfo(path=filepath, url=link, name=os.path.basename(filepath), sha256=item.sha256))
+                continue
             log.info(f"下載媒體貼文：{link}")
-            filename = mediafire_downloader(link, folder)
+            filename = download_mediafire(link, folder, segments)
             filepath = os.path.join(folder, filename)
             file_info = post_parse.FileInfo(path=filepath, url=link, name=filename)
         if file_info:
             if file_info.size:
                 success.append(file_info)
-                try:
-                    compress.UncompresserFactory.get_uncompresser(filepath).uncompress(filepath)
-                except Exception as e:
-                    pass
+                file_info.sha256 = record_download(manifest, link, filepath)
+                extract_download(filepath, file_info.sha256, store)
             elif not file_info.name:
                 unknown.append(file_info)
             else:
                 error.append(file_info)
-    return success, error, unknown
\ No newline at end of file
+    return success, error, unknown
@@ -0,0 +1,84 @@
+import re
+import json
+import asyncio
+import aiohttp
+import logging
+
+from youtube_community_tab.post import Post
+
+from src.utils.tools import deep_get
+from src.utils.rate_limit import limiter
+
+# 以 aiohttp 讀取社群貼文，輸出與 Post.as_json() 相同格式的貼文json
+
+POST_URL = "https://www.youtube.com/post/{post_id}"
+INITIAL_DATA_REGEX = r"(?:window\[\"ytInitialData\"\]|var ytInitialData)\s*=\s*({.+?});\s*</script>"
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+DEFAULT_COOKIES = {
+    "SOCS": "CAESNQgDEitib3FfaWRlbnRpdHlmcm9udGVuZHVpc2VydmVyXzIwMjIwNzA1LjE2X3AwGgJwdCACGgYIgOedlgY",
+    "CONSENT": "PENDING+917",
+}
+
+log = logging.getLogger(__name__)
+
+def create_session(cookies: dict | None = None) -> aiohttp.ClientSession:
+    """建立讀取YouTube用的session，未輸入cookies時使用預設cookies"""
+    return aiohttp.ClientSession(headers=DEFAULT_HEADERS, cookies=cookies or DEFAULT_COOKIES)
+
+def extract_initial_data(html: str) -> dict:
+    if initial_data_m := re.search(INITIAL_DATA_REGEX, html):
+        return json.loads(initial_data_m.group(1))
+    raise Exception("無法取得頁面資料，資料格式可能已變更")
+
+def convert_post(renderer: dict) -> dict | None:
+    """將 backstagePostRenderer 轉成 Post.as_json() 格式"""
+    if not renderer:
+        return None
+    return Post.from_data(renderer).as_json()
+
+class CommunityFetcher:
+    """以單一 aiohttp session 讀取單則社群貼文"""
+    def __init__(self, session: aiohttp.ClientSession) -> None:
+        self.session = session
+
+    async def get_text(self, url: str) -> str:
+        await limiter.async_wait(url)
+        async with self.session.get(url) as response:
+            if response.status != 200:
+                raise Exception(f"HTTP 狀態碼錯誤: {response.status}，URL: {url}")
+            return await response.text()
+
+    async def fetch_post(self, post_id: str) -> dict | None:
+        """讀取單則貼文"""
+        data = extract_initial_data(await self.get_text(POST_URL.format(post_id=post_id)))
+        contents = deep_get(data, ['contents', 'twoColumnBrowseResultsRenderer', 'tabs', 0, 'tabRenderer', 'content', 'sectionListRenderer', 'contents', 0, 'itemSectionRenderer', 'contents'], [])
+        for item in contents:
+            post = convert_post(deep_get(item, ['backstagePostThreadRenderer', 'post', 'backstagePostRenderer'], {}))
+            if post:
+                return post
+        log.warning(f"無法解析貼文：{post_id}")
+        return None
+
+async def _bounded(semaphore: asyncio.Semaphore, coroutine):
+    async with semaphore:
+        return await coroutine
+
+async def fetch_posts(post_ids: list[str], cookies: dict | None = None, concurrency: int = 8) -> dict[str, dict]:
+    """同時讀取多則貼文，回傳 {貼文ID: 貼文json}"""
+    semaphore = asyncio.Semaphore(concurrency)
+    async with create_session(cookies) as session:
+        fetcher = CommunityFetcher(session)
+        results = await asyncio.gather(
+            *[_bounded(semaphore, fetcher.fetch_post(post_id)) for post_id in post_ids],
+            return_exceptions=True,
+        )
+    posts = {}
+    for post_id, result in zip(post_ids, results):
+        if isinstance(result, BaseException):
+            log.error(f"讀取貼文失敗：{post_id}，原因：{result}")
+        elif result:
+            posts[post_id] = result
+    return posts
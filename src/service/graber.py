@@ -1,23 +1,39 @@
+import os
 import re
+import asyncio
 import sys
+import json
 import logging
-from typing import List
-from requests.cookies import create_cookie
+import tempfile
+import threading
+import requests
+from typing import List, Iterable, Iterator, Callable, Protocol
+from requests.cookies import create_cookie, RequestsCookieJar
 from http import cookiejar
 from youtube_community_tab.post import Post
 from youtube_community_tab.community_tab import CommunityTab
 from youtube_community_tab.requests_handler import requests_cache
 
+from src.app_types.database import Data_Crawl
+from src.service import fetcher
+from src.utils.rate_limit import limiter
+
 #This is a modified version of youtube_community_tab
 #https://github.com/HoloArchivists/youtube-community-tab
 
 POST_REGEX=r"^(?:(?:https?:\/\/)?(?:.*?\.)?(?:youtube\.com\/)((?:channel\/UC[a-zA-Z0-9_-]+\/community\?lb=)|post\/))?(?P<post_id>Ug[a-zA-Z0-9_-]+)(.*)?$"
 CHANNEL_REGEX=r"^(?:(?:https?:\/\/)?(?:.*?\.)?(?:youtube\.com\/))((?P<channel_handle>@[a-zA-Z0-9_-]+)|((channel\/)?(?P<channel_id>UC[a-zA-Z0-9_-]+)))(?:\/.*)?$"
 HANDLE_TO_ID_REGEX = r'"channelId":"(UC[a-zA-Z0-9_-]+)"'
+YOUTUBE_URL = "https://www.youtube.com"
 CLEAN_FILENAME_KINDA=r"[^\w\-_\. \[\]\(\)]"
 
 log = logging.getLogger(__name__)
 
+class PidLookup(Protocol):
+    """已紀錄貼文ID的查詢物件(set 或資料庫查詢)，intersection 以單次查詢確認多則貼文"""
+    def __contains__(self, pid: object) -> bool: ...
+    def intersection(self, pids: Iterable[str]) -> set: ...
+
 def use_default_cookies():
     requests_cache.cookies.set(
         'SOCS',
@@ -32,21 +48,32 @@ def use_default_cookies():
         path='/'
     )
 
-def use_cookies(cookie_jar_path):
+# 已解析的cookies檔快取：{路徑: (修改時間, cookie jar)}
+_cookie_jars: dict[str, tuple[float, RequestsCookieJar]] = {}
+_cookie_jars_lock = threading.Lock()
+
+def load_cookie_jar(cookie_jar_path: str) -> RequestsCookieJar | None:
+    """讀取cookies檔並轉成 requests 的 cookie jar，依路徑與修改時間快取"""
+    try:
+        mtime = os.path.getmtime(cookie_jar_path)
+    except OSError:
+        log.error(f"無法找到cookies檔：{cookie_jar_path}，繼續使用預設cookies...")
+        return None
+    with _cookie_jars_lock:
+        cached = _cookie_jars.get(cookie_jar_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
     cookie_jar = cookiejar.MozillaCookieJar(cookie_jar_path)
     try:
         cookie_jar.load()
         log.info(f"讀取cookies路徑：{cookie_jar_path}")
-    except FileNotFoundError:
-        use_default_cookies()
-        log.error(f"無法找到cookies檔：{cookie_jar_path}，繼續使用預設cookies...")
-        return
     except (cookiejar.LoadError, OSError) as e:
-        use_default_cookies()
         log.error(f"{e}")
         log.error(f"無法讀取cookies：{cookie_jar_path}，繼續使用預設cookies")
-        return
-        # 將 MozillaCookieJar 的 cookies 一個一個轉入 requests 的 cookie jar
+        return None
+    # 將 MozillaCookieJar 的 cookies 一個一個轉入 requests 的 cookie jar
+    jar = RequestsCookieJar()
     for c in cookie_jar:
         cookie = create_cookie(
             name=c.name,
@@ -56,67 +83,227 @@ def use_cookies(cookie_jar_path):
             secure=c.secure,
             expires=c.expires,
         )
-        requests_cache.cookies.set_cookie(cookie)
-        
+        jar.set_cookie(cookie)
+    with _cookie_jars_lock:
+        _cookie_jars[cookie_jar_path] = (mtime, jar)
+    return jar
+
+def get_cookie_dict(cookie_jar_path: str = "") -> dict | None:
+    """取得cookies字典，供 aiohttp 等其他 session 使用"""
+    jar = load_cookie_jar(cookie_jar_path) if cookie_jar_path else None
+    return jar.get_dict() if jar is not None else None
+
+def create_config_session(cookies: RequestsCookieJar | None = None) -> requests.Session:
+    """建立設定檔專屬的session，複製共用session的標頭與預設cookies後加入該設定檔的cookies
+    回應中的 Set-Cookie 只寫入此session，不會帶入其他設定檔的請求
+    """
+    session = requests.Session()
+    session.headers.update(requests_cache.headers)
+    session.cookies.update(requests_cache.cookies.copy())
+    if cookies is not None:
+        session.cookies.update(cookies.copy())
+    return session
+
+class ThreadSessionProxy:
+    """依執行緒轉發至該執行緒綁定的session，未綁定時使用共用的session"""
+    def __init__(self, default) -> None:
+        self._default = default
+        self._local = threading.local()
+
+    def bind(self, session: requests.Session):
+        previous = getattr(self._local, 'session', None)
+        self._local.session = session
+        if previous is not None:
+            previous.close()
+
+    def __getattr__(self, name):
+        return getattr(getattr(self._local, 'session', None) or self._default, name)
+
+session_proxy = ThreadSessionProxy(requests_cache)
+
+def install_session_proxy():
+    """將 youtube_community_tab 內使用的共用session替換成依執行緒轉發的session"""
+    for name, module in list(sys.modules.items()):
+        if name.startswith('youtube_community_tab') and getattr(module, 'requests_cache', None) is requests_cache:
+            setattr(module, 'requests_cache', session_proxy)
+
+def bind_session(cookies_path: str = "") -> requests.Session:
+    """為目前執行緒建立設定檔專屬的session，之後此執行緒的爬取皆使用該session"""
+    session = create_config_session(load_cookie_jar(cookies_path) if cookies_path else None)
+    session_proxy.bind(session)
+    return session
+
+use_default_cookies()
+install_session_proxy()
+
 def get_channel_id_from_handle(channel_handle):
     handle_url = f"https://youtube.com/{channel_handle}"
-    channel_home_r = requests_cache.get(handle_url)
+    limiter.wait(handle_url)
+    channel_home_r = session_proxy.get(handle_url)
     if not channel_home_r.ok:
-        log.critical(f"無法將頻道標籤轉換為頻道ID編號，無回應{handle_url}")
-        sys.exit(1)
+        raise Exception(f"無法將頻道標籤轉換為頻道ID編號，無回應{handle_url}")
     channel_home = channel_home_r.text
     if (channel_id_m := re.search(HANDLE_TO_ID_REGEX, channel_home)) and \
         (channel_id := channel_id_m.group(1)):
         return channel_id
-    log.critical(f"無法將頻道標籤轉換為頻道ID編號，資料格式可能已變更")
-    sys.exit(1)
+    raise Exception(f"無法將頻道標籤轉換為頻道ID編號，資料格式可能已變更：{channel_handle}")
 
 def get_post(post_id):
+    limiter.wait(YOUTUBE_URL)
     post = Post.from_post_id(post_id)
     return post
 
-def get_channel_posts(channel_id:str, reverse: bool = True):
-    """讀取頻道的全部社群貼文"""
+def is_known_page(posts: List[Post], known_pids: PidLookup) -> bool:
+    """判斷該頁貼文是否皆已紀錄"""
+    pids = {post.post_id for post in posts}
+    return bool(pids) and len(known_pids.intersection(pids)) == len(pids)
+
+def iter_channel_pages(channel_id: str, known_pids: PidLookup | None = None, overlap_pages: int = 1, checkpoint: Data_Crawl | None = None, on_page: Callable[[Data_Crawl], None] | None = None) -> Iterator[List[Post]]:
+    """逐頁讀取頻道的社群貼文(新到舊)，每頁交出後即從CommunityTab釋放
+    有輸入known_pids時為增量模式，連續overlap_pages頁皆為已紀錄貼文即停止翻頁
+    有輸入checkpoint時從紀錄的翻頁憑證繼續讀取，並在每頁處理完後更新checkpoint並呼叫on_page
+    """
     ct = CommunityTab(channel_id)
     ct.channel_id = channel_id
-    page_count = 1
-    print(f"從社群貼文中獲取貼文 (頁面{page_count})", end="\r")
-    ct.load_posts(0)
-    while(ct.posts_continuation_token):
+    page_count = 0
+    if checkpoint and checkpoint.page_count:
+        if not checkpoint.continuation_token:
+            log.info(f"頻道貼文已讀取完畢(共 {checkpoint.page_count} 頁)，略過爬取")
+            return
+        ct.posts_continuation_token = checkpoint.continuation_token
+        ct.click_tracking_params = checkpoint.click_tracking_params
+        ct.visitor_data = checkpoint.visitor_data
+        page_count = checkpoint.page_count
+        log.info(f"從第 {page_count + 1} 頁繼續爬取")
+    start_page = page_count
+    post_count = 0
+    known_streak = 0
+    while page_count == start_page or ct.posts_continuation_token:
         page_count += 1
         print(f"從社群貼文中獲取貼文 (頁面{page_count})", end="\r")
+        limiter.wait(YOUTUBE_URL)
         ct.load_posts(0)
+        page, ct.posts = ct.posts, []
+        post_count += len(page)
+        yield page
+        stop = False
+        if known_pids is not None:
+            if is_known_page(page, known_pids):
+                known_streak += 1
+            else:
+                known_streak = 0
+            if known_streak >= max(overlap_pages, 1):
+                log.info(f"連續 {known_streak} 頁皆為已紀錄貼文，停止翻頁")
+                stop = True
+        if checkpoint is not None:
+            checkpoint.page_count = page_count
+            checkpoint.continuation_token = "" if stop else (ct.posts_continuation_token or "")
+            checkpoint.click_tracking_params = getattr(ct, "click_tracking_params", "") or ""
+            checkpoint.visitor_data = getattr(ct, "visitor_data", "") or ""
+            if on_page:
+                on_page(checkpoint)
+        if stop:
+            break
     log.info(f"從社群貼文中獲取貼文 (頁面{page_count})")
-    log.info(f"找到 {len(ct.posts)} 則貼文")
-    if reverse:
-        ct.posts = list(reversed(ct.posts))
-    return ct.posts
+    log.info(f"找到 {post_count} 則貼文")
+
+def reorder_oldest_first(pages: Iterable[List[Post]], folder: str = "", start_index: int = 0) -> Iterator[dict]:
+    """將新到舊的頁面逐頁暫存至硬碟，再以舊到新的順序逐則讀出貼文json
+    記憶體中同時只保留一頁貼文
+    有輸入folder時暫存於該資料夾，中斷後可從start_index頁接續，頁面需由呼叫端在完成後清除
+    """
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+        yield from _spill_and_replay(pages, folder, start_index)
+    else:
+        with tempfile.TemporaryDirectory(prefix="yt_posts_") as temp_folder:
+            yield from _spill_and_replay(pages, temp_folder, start_index)
+
+def _spill_and_replay(pages: Iterable[List[Post]], folder: str, page_index: int) -> Iterator[dict]:
+    for page in pages:
+        page_file = os.path.join(folder, f"{page_index:06d}.jsonl")
+        with open(page_file, 'w', encoding='utf-8') as f:
+            for post in page:
+                f.write(json.dumps(post.as_json(), ensure_ascii=False) + "\n")
+        page_index += 1
+    page_files = sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.endswith(".jsonl") and int(os.path.splitext(name)[0]) < page_index
+    )
+    for page_file in reversed(page_files):
+        with open(page_file, 'r', encoding='utf-8') as f:
+            page_contents = [json.loads(line) for line in f]
+        # 頁面保留至全部處理完畢，中斷時重新讀取，已紀錄的貼文由呼叫端略過
+        yield from reversed(page_contents)
 
 def clean_name(text):
     return re.sub(CLEAN_FILENAME_KINDA, "_", text)
 
-def main(link: str, cookies_path: str= "", reverse: bool=True) -> List[Post]:
-    if cookies_path:
-        use_cookies(cookies_path)
-    else:
-        use_default_cookies()
-    posts = []
+def resolve_link(link: str, resolve_handle: Callable[[str], str] = get_channel_id_from_handle) -> tuple[str, str]:
+    """解析網址類型，回傳 ("post", 貼文ID)、("channel", 頻道ID) 或 ("", "")
+    resolve_handle 用於將頻道標籤轉換為頻道ID，可替換為帶有快取的版本
+    """
     post_id_m = re.search(POST_REGEX, link)
     channel_id_m = re.search(CHANNEL_REGEX, link)
     if post_id_m:
         log.info(f"開始解析貼文網址...")
-        post_id = post_id_m.group("post_id")
-        posts.append(get_post(post_id))
+        return "post", post_id_m.group("post_id")
     elif channel_id_m:
         channel_handle = channel_id_m.group("channel_handle")
         if channel_handle:
-            channel_id = get_channel_id_from_handle(channel_handle)
+            channel_id = resolve_handle(channel_handle)
             log.info(f"將頻道標籤轉換為頻道ID編號：{channel_handle} -> {channel_id}")
         else:
             channel_id = channel_id_m.group("channel_id")
         log.info(f"開始解析頻道網址...")
-        posts.extend(get_channel_posts(channel_id, reverse))
-    else:
-        log.info(f"無法解析的網址類型：{link}")
+        return "channel", channel_id
+    log.info(f"無法解析的網址類型：{link}")
+    return "", ""
+
+def iter_posts(link: str, cookies_path: str= "", reverse: bool=True, known_pids: PidLookup | None = None, overlap_pages: int = 1, checkpoint: Data_Crawl | None = None, on_page: Callable[[Data_Crawl], None] | None = None, spill_folder: str = "", resolve_handle: Callable[[str], str] = get_channel_id_from_handle) -> Iterator[dict]:
+    """以生成器逐則交出貼文json，reverse時經由硬碟暫存排序成舊到新
+    有輸入checkpoint時為可續傳模式，需搭配spill_folder保存已讀取的頁面
+    """
+    bind_session(cookies_path)
+    link_type, link_id = resolve_link(link, resolve_handle)
+    if link_type == "post":
+        yield get_post(link_id).as_json()
+    elif link_type == "channel":
+        start_index = checkpoint.page_count if checkpoint else 0
+        pages = iter_channel_pages(link_id, known_pids, overlap_pages, checkpoint, on_page)
+        if reverse:
+            yield from reorder_oldest_first(pages, spill_folder, start_index)
+        else:
+            for page in pages:
+                for post in page:
+                    yield post.as_json()
     log.info("爬取完成！")
-    return posts
\ No newline at end of file
+
+def read_link_file(filepath: str) -> list[str]:
+    """讀取網址清單檔，每行一則貼文網址或ID，忽略空行與#開頭的註解"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+def parse_post_ids(links: Iterable[str]) -> list[str]:
+    """從貼文網址或ID取出不重複的貼文ID，保持輸入順序"""
+    post_ids = []
+    for link in links:
+        if post_id_m := re.search(POST_REGEX, link.strip()):
+            post_ids.append(post_id_m.group("post_id"))
+        else:
+            log.warning(f"無法解析的貼文網址：{link}")
+    return list(dict.fromkeys(post_ids))
+
+def iter_bulk_posts(links: Iterable[str], cookies_path: str = "", workers: int = 8, known_pids: PidLookup | None = None) -> Iterator[dict]:
+    """批次讀取多則貼文，去除已紀錄的貼文後以 workers 個連線同時讀取，依輸入順序交出貼文json"""
+    post_ids = parse_post_ids(links)
+    if known_pids is not None:
+        skip_count = len(post_ids)
+        post_ids = [post_id for post_id in post_ids if post_id not in known_pids]
+        log.info(f"略過已紀錄貼文 {skip_count - len(post_ids)} 則")
+    log.info(f"開始批次讀取貼文 {len(post_ids)} 則...")
+    posts = asyncio.run(fetcher.fetch_posts(post_ids, get_cookie_dict(cookies_path), workers))
+    log.info(f"批次讀取完成，成功 {len(posts)} 則，失敗 {len(post_ids) - len(posts)} 則")
+    for post_id in post_ids:
+        if post_id in posts:
+            yield posts.pop(post_id)
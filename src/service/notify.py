@@ -3,6 +3,7 @@ import sys
 import json
 import time
 import copy
+import hashlib
 import logging
 import requests
 
@@ -10,6 +11,7 @@ from typing import Dict
 
 from src.app_types import discord, post_parse
 from src.service import compress
+from src.utils.rate_limit import limiter
 
 def get_split_line():
     if getattr(sys, 'frozen', False):
@@ -91,6 +93,7 @@ class discord_post:
             else:
                 if not filename:
                     filename = os.path.basename(file.split("=", 1)[0])
+                limiter.wait(file)
                 response = requests.get(file)
                 if response.status_code == 200:
                     file_byte = response.content
@@ -106,6 +109,7 @@ class discord_post:
 
     def send(self, source_post: discord.Post, files: Dict[str, bytes]|None = None):
         post = discord.serialize_clean_dict(source_post)
+        limiter.wait(self.webhook)
         if files:
             response = requests.post(self.webhook, data=post, files=files)
         else:
@@ -174,9 +178,12 @@ def send_post(webhook: str, post_parser: post_parse.PostParser):
     set_post.start_send()
 
     
-def send_media(webhook: str, post_parser: post_parse.PostParser, success: list[post_parse.FileInfo], error: list[post_parse.FileInfo], unknown: list[post_parse.FileInfo]):
+def send_media(webhook: str, post_parser: post_parse.PostParser, success: list[post_parse.FileInfo], error: list[post_parse.FileInfo], unknown: list[post_parse.FileInfo], store=None):
+    """發送下載狀態通知，輸入內容庫(store)時已上傳到同一頻道的相同內容只附上連結"""
     if not success and not error and not unknown:
         return
+    webhook_key = hashlib.sha256(webhook.encode('utf-8')).hexdigest()[:16]
+    uploaded = []
     
     set_post = discord_post(webhook)
     # 初始化貼文基礎資訊
@@ -199,8 +206,10 @@ def send_media(webhook: str, post_parser: post_parse.PostParser, success: list[p
     # 添加貼文內文
     description = ""
     for file in success:
-        description += f"成功：[{file.name}]({file.url})\n"
-        if file.size < discord.FILE_LIMIT:
+        blob = store.get(file.sha256) if store is not None else None
+        duplicate = bool(blob) and blob.uploaded == webhook_key
+        description += f"成功：[{file.name}]({file.url}){'(相同檔案已上傳過)' if duplicate else ''}\n"
+        if not duplicate and file.size < discord.FILE_LIMIT:
             c_filepath = file.path
             if not os.path.isfile(file.path):
                 c_filepath = file.path + '.7z'
@@ -208,6 +217,8 @@ def send_media(webhook: str, post_parser: post_parse.PostParser, success: list[p
                     log.info(f"壓縮檔案：{c_filepath}")
                     compress.compress_to_7z(file.path)
             set_post.add_file(filename=file.name, file=c_filepath)
+            if blob:
+                uploaded.append(file.sha256)
 
         if os.path.isfile(file.path):
             file_ext = file.path.split('.')[-1]
@@ -223,4 +234,6 @@ def send_media(webhook: str, post_parser: post_parse.PostParser, success: list[p
         description += f"未知：[{n}.檔案]({file.url})\n"
     set_post.add_embed(description=description)
     
-    set_post.start_send()
\ No newline at end of file
+    set_post.start_send()
+    for sha256 in uploaded:
+        store.mark(sha256, 'uploaded', webhook_key)
\ No newline at end of file
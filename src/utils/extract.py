@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Sequence
+
+# 取值失敗(鍵不存在、索引超出範圍、型別不符)時使用預設值
+_LOOKUP_ERRORS = (KeyError, IndexError, TypeError, AttributeError)
+
+@dataclass(frozen=True)
+class Field:
+    """欄位取值設定
+    path 為逐層的鍵或索引，取得的值為None或取值失敗時使用 default，transform 套用在最後結果(包含預設值)
+    """
+    path: Sequence[str | int]
+    default: Any = None
+    transform: Callable[[Any], Any] | None = None
+
+class Schema:
+    """將欄位設定編譯成單一取值函式，每個欄位直接以索引取值，不需逐層檢查型別"""
+    def __init__(self, fields: dict[str, Field]) -> None:
+        self.fields = fields
+        self.extract: Callable[[Any], dict] = self.compile()
+
+    def compile(self) -> Callable[[Any], dict]:
+        namespace: dict[str, Any] = {'_LOOKUP_ERRORS': _LOOKUP_ERRORS}
+        lines = ['def extract(data):', '    result = {}']
+        for index, (name, field) in enumerate(self.fields.items()):
+            for key in field.path:
+                if not isinstance(key, (str, int)):
+                    raise TypeError(f"欄位 {name} 的路徑只能包含字串或整數：{key!r}")
+            default = f'_default_{index}'
+            namespace[default] = field.default
+            lookup = 'data' + ''.join(f'[{key!r}]' for key in field.path)
+            value = f'_transform_{index}(value)' if field.transform else 'value'
+            if field.transform:
+                namespace[f'_transform_{index}'] = field.transform
+            lines += [
+                '    try:',
+                f'        value = {lookup}',
+                '    except _LOOKUP_ERRORS:',
+                '        value = None',
+                '    if value is None:',
+                f'        value = {default}',
+                f'    result[{name!r}] = {value}',
+            ]
+        lines.append('    return result')
+        exec('\n'.join(lines), namespace)
+        return namespace['extract']
@@ -0,0 +1,35 @@
+import json
+import zlib
+
+from functools import lru_cache
+
+from src.utils import path_format
+
+# 壓縮後的資料格式：MAGIC + 字典版本(1 byte) + zlib 資料
+MAGIC = b'YPZ'
+COMPRESS_LEVEL = 9
+
+# 字典版本，壓縮字典以固定的資料檔保存(src/data/json_dict_v{版本}.bin)，已壓縮的資料依版本讀取對應字典
+# 新字典以 tools/train_json_dictionary.py 從實際貼文產生，使用新的版本號，既有版本的資料檔不可修改
+CURRENT_VERSION = 1
+
+@lru_cache(maxsize=None)
+def get_dictionary(version: int) -> bytes:
+    with open(path_format.get_json_dictionary(version), 'rb') as f:
+        return f.read()
+
+def encode(value) -> bytes:
+    """將值序列化為json並以預設字典壓縮"""
+    data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zdict=get_dictionary(CURRENT_VERSION))
+    return MAGIC + bytes([CURRENT_VERSION]) + compressor.compress(data) + compressor.flush()
+
+def is_encoded(value) -> bool:
+    return isinstance(value, bytes) and value[:len(MAGIC)] == MAGIC
+
+def decode(value: bytes):
+    """解壓縮並還原json"""
+    version = value[len(MAGIC)]
+    decompressor = zlib.decompressobj(zdict=get_dictionary(version))
+    data = decompressor.decompress(value[len(MAGIC) + 1:]) + decompressor.flush()
+    return json.loads(data)
@@ -1,6 +1,8 @@
 import os
 import sys
 
+from src import BASE_DIR
+
 def get_mdrs():
     if getattr(sys, 'frozen', False):
         # ✅ getattr 安全存取，避免靜態報錯
@@ -19,3 +21,11 @@ def get_unrar():
     else:
         base_path = os.getcwd()
     return os.path.join(base_path, 'src', 'data', 'UnRAR.exe')
+
+def get_json_dictionary(version: int):
+    """貼文json壓縮字典，由 tools/train_json_dictionary.py 產生"""
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.join(getattr(sys, '_MEIPASS', os.getcwd()), 'src')
+    else:
+        base_path = str(BASE_DIR)
+    return os.path.join(base_path, 'data', f'json_dict_v{version}.bin')
@@ -0,0 +1,61 @@
+import time
+import asyncio
+import threading
+
+from urllib.parse import urlparse
+
+# 各主機預設的最小請求間隔(秒)，以網域結尾比對，子網域共用同一個限制，可由執行參數調整
+HOST_INTERVALS = {
+    'youtube.com': 1.0,
+    'discord.com': 0.5,
+    'discordapp.com': 0.5,
+    'mediafire.com': 1.0,
+}
+
+class HostRateLimiter:
+    """依遠端主機限制請求間隔，供所有執行緒共用"""
+    def __init__(self, intervals: dict[str, float]) -> None:
+        self.intervals = intervals
+        self.next_times: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def configure(self, intervals: dict[str, float]):
+        """更新各主機的請求間隔，間隔小於等於0時取消該主機的限制"""
+        with self.lock:
+            for domain, interval in intervals.items():
+                if interval > 0:
+                    self.intervals[domain] = interval
+                else:
+                    self.intervals.pop(domain, None)
+                    self.next_times.pop(domain, None)
+
+    def get_bucket(self, url: str) -> str:
+        """取得網址對應的限制主機，無限制時回傳空字串"""
+        host = urlparse(url).hostname or url
+        for domain in self.intervals:
+            if host == domain or host.endswith('.' + domain):
+                return domain
+        return ''
+
+    def reserve(self, url: str) -> float:
+        """預約下一次請求時間，回傳需等待的秒數"""
+        bucket = self.get_bucket(url)
+        if not bucket:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            next_time = max(self.next_times.get(bucket, 0), now)
+            self.next_times[bucket] = next_time + self.intervals[bucket]
+        return next_time - now
+
+    def wait(self, url: str):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def async_wait(self, url: str):
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+limiter = HostRateLimiter(dict(HOST_INTERVALS))
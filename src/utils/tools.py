@@ -1,5 +1,8 @@
 import os
-from typing import Any, TypeVar, Union, Sequence, Mapping
+import hashlib
+from itertools import islice
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from typing import Any, TypeVar, Union, Sequence, Mapping, Iterable, Iterator
 
 
 OriginImageEndPoint = '=s0?imgmax=0'
@@ -24,6 +27,30 @@ def get_size(path: str) -> int:
     else:
         raise FileNotFoundError(f"找不到路徑：{path}")
 
+def canonical_url(url: str) -> str:
+    """統一網址格式：小寫協定與主機、移除預設連接埠與#片段、排序查詢參數"""
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or 'https').lower()
+    netloc = parts.netloc.lower()
+    if (scheme, netloc.rsplit(':', 1)[-1]) in (('http', '80'), ('https', '443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+def hash_file(path: str, hasher=None, chunk_size: int = 1048576) -> str:
+    """計算檔案的 SHA-256，可輸入已累積部分內容的 hasher 接續計算"""
+    hasher = hasher or hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def chunked(iterable: Iterable[T], size: int) -> Iterator[list[T]]:
+    """將可迭代物件依指定數量分批"""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
 def deep_get(
     data: Union[Mapping[str, Any], Sequence[Any]],
     keys: Sequence[Union[str, int]],
@@ -0,0 +1,114 @@
+"""以實際貼文json產生 json_codec 的壓縮字典
+
+使用方式：
+    python tools/train_json_dictionary.py [貼文json檔案或資料夾 ...] [--archive 資料庫 --table 儲存表 ...] [--version N]
+
+貼文來源可使用 post_output 儲存的 {pid}.json，或資料庫中紀錄的貼文內容
+樣本的八成用於產生字典，其餘兩成比較壓縮率，字典寫入 src/data/json_dict_v{版本}.bin
+確認壓縮率後將 json_codec.CURRENT_VERSION 改為新版本，既有版本的字典檔不可修改或刪除
+"""
+import os
+import sys
+import json
+import zlib
+import random
+import sqlite3
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import Counter
+from typing import Iterable, Iterator
+
+from src.utils import json_codec, path_format
+
+
+def train_dictionary(samples: Iterable[str], size: int = 32768) -> bytes:
+    """統計樣本中出現的json片段產生字典，出現次數越多的片段放在越後面(zlib 優先參照字典尾端)"""
+    counter = Counter()
+    for sample in samples:
+        tokens = set()
+        for token in sample.replace('{', '\n{').replace('[', '\n[').split('\n'):
+            token = token.strip()
+            if 4 <= len(token) <= 256:
+                tokens.add(token)
+        # 以出現在多少則貼文計算，避免單則貼文內重複的片段佔滿字典
+        counter.update(tokens)
+    dictionary = b''
+    for token, count in counter.most_common():
+        if count < 2:
+            break
+        encoded = token.encode('utf-8')
+        if len(dictionary) + len(encoded) > size:
+            break
+        dictionary = encoded + dictionary
+    return dictionary
+
+def iter_json_files(paths: list[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith('.json'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def load_samples(paths: list[str], archive: str, tables: list[str]) -> list[str]:
+    """讀取貼文json，統一為 json_codec 壓縮前的格式"""
+    samples = []
+    for filepath in iter_json_files(paths):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            samples.append(json.dumps(json.load(f), ensure_ascii=False))
+    if archive:
+        conn = sqlite3.connect(archive)
+        for table in tables:
+            for (content,) in conn.execute(f'SELECT content FROM {table}'):
+                value = json_codec.decode(content) if json_codec.is_encoded(content) else json.loads(content)
+                if value:
+                    samples.append(json.dumps(value, ensure_ascii=False))
+        conn.close()
+    return samples
+
+def compressed_size(samples: list[str], dictionary: bytes | None) -> int:
+    total = 0
+    for sample in samples:
+        compressor = zlib.compressobj(json_codec.COMPRESS_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(json_codec.COMPRESS_LEVEL)
+        total += len(compressor.compress(sample.encode('utf-8')) + compressor.flush())
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="以實際貼文json產生壓縮字典")
+    parser.add_argument('paths', nargs='*', help="貼文json檔案或資料夾")
+    parser.add_argument('--archive', default='', help="資料庫路徑")
+    parser.add_argument('--table', action='append', default=[], help="資料庫中的儲存表名稱，可重複指定")
+    parser.add_argument('--version', type=int, default=json_codec.CURRENT_VERSION + 1, help="字典版本")
+    parser.add_argument('--size', type=int, default=32768, help="字典大小上限(bytes)")
+    args = parser.parse_args()
+
+    output = path_format.get_json_dictionary(args.version)
+    if os.path.exists(output):
+        parser.error(f"字典版本 {args.version} 已存在，既有字典不可覆寫：{output}")
+    samples = load_samples(args.paths, args.archive, args.table)
+    if len(samples) < 10:
+        parser.error(f"貼文樣本不足(共 {len(samples)} 則)，請指定 post_output 資料夾或資料庫儲存表")
+
+    random.Random(0).shuffle(samples)
+    split = len(samples) * 4 // 5
+    train, holdout = samples[:split], samples[split:]
+    dictionary = train_dictionary(train, args.size)
+
+    raw = sum(len(sample.encode('utf-8')) for sample in holdout)
+    print(f"樣本：{len(train)} 則產生字典，{len(holdout)} 則比較壓縮率，字典大小 {len(dictionary)} bytes")
+    print(f"原始大小：{raw} bytes")
+    print(f"無字典：{compressed_size(holdout, None) / raw:.3f}")
+    print(f"目前版本 {json_codec.CURRENT_VERSION}：{compressed_size(holdout, json_codec.get_dictionary(json_codec.CURRENT_VERSION)) / raw:.3f}")
+    print(f"新版本 {args.version}：{compressed_size(holdout, dictionary) / raw:.3f}")
+
+    with open(output, 'wb') as f:
+        f.write(dictionary)
+    print(f"已寫入：{output}")
+    print(f"確認壓縮率後將 src/utils/json_codec.py 的 CURRENT_VERSION 改為 {args.version}")
+
+if __name__ == '__main__':
+    main()